@@ -0,0 +1 @@
+"""Benchmarks of the service, run them as modules of this package"""
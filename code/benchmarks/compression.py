@@ -0,0 +1,110 @@
+"""Benchmark of the response compression bandwidth against CPU tradeoff
+
+Renders the largest responses of a seeded dataset once and compresses
+them with each coding and level, reporting the size, the CPU time and
+the time to send the result over a link of the given bandwidth.
+
+    python -m code.benchmarks.compression --bandwidth-mbps 10
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from ..database.mongodb import get_database
+from ..helpers.compression import BrotliCompressor, GzipCompressor
+from ..helpers.compression import get_brotli
+from ..main import app
+from .datasets import Dataset, add_dataset_arguments, get_benchmark_database
+from .datasets import seed_database
+
+
+RESPONSES = {
+    '/invitations/': {},
+    '/guests/ (ndjson)': {'headers': {'Accept': 'application/x-ndjson'}},
+    '/guests/export': {},
+}
+
+
+def get_compressors() -> dict:
+    """Factories of the compressors to compare"""
+    compressors = {f'gzip-{level}': lambda level=level: GzipCompressor(level)
+                   for level in (1, 6, 9)}
+    brotli = get_brotli()
+    if brotli is not None:
+        compressors |= {
+            f'br-{quality}':
+                lambda quality=quality: BrotliCompressor(brotli, quality)
+            for quality in (1, 4, 11)}
+    return compressors
+
+
+async def render_bodies() -> dict:
+    """Uncompressed body of each response"""
+    bodies = {}
+    async with httpx.AsyncClient(
+            app=app, base_url='http://benchmark',
+            headers={'Authorization': 'Bearer benchmark',
+                     'Accept-Encoding': 'identity'}) as client:
+        for name, options in RESPONSES.items():
+            url = name.split(' ')[0]
+            response = await client.get(url, **options)
+            response.raise_for_status()
+            bodies[name] = response.content
+    return bodies
+
+
+def measure(create_compressor, body: bytes, chunk_size: int, repeat: int):
+    """Compressed size and best time compressing body by chunks"""
+    chunks = [body[offset:offset + chunk_size]
+              for offset in range(0, len(body), chunk_size)] or [b'']
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        compressor = create_compressor()
+        size = sum(len(compressor.compress(chunk)) for chunk in chunks[:-1])
+        size += len(compressor.finish(chunks[-1]))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return size, best
+
+
+async def run(args):
+    """Seeds the dataset and compares every compressor"""
+    database = get_benchmark_database(args)
+    await seed_database(database, Dataset(
+        args.invitations, args.guests, args.songs, args.seed))
+    app.dependency_overrides[get_database] = lambda: database
+    bodies = await render_bodies()
+    app.dependency_overrides.pop(get_database, None)
+
+    bytes_per_second = args.bandwidth_mbps * 1e6 / 8
+    for name, body in bodies.items():
+        print(f'{name}: {len(body)} bytes, '
+              f'{len(body) / bytes_per_second * 1000:.0f} ms to send')
+        for coding, create_compressor in get_compressors().items():
+            size, elapsed = measure(create_compressor, body,
+                                    args.chunk_size, args.repeat)
+            total = elapsed + size / bytes_per_second
+            print(f'  {coding}: {size} bytes '
+                  f'({len(body) / size:.1f}x), '
+                  f'cpu {elapsed * 1000:.1f} ms '
+                  f'({len(body) / elapsed / 1e6:.1f} MB/s), '
+                  f'cpu + send {total * 1000:.0f} ms')
+
+
+def main():
+    """Command line entrypoint"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_dataset_arguments(parser)
+    parser.add_argument('--bandwidth-mbps', type=float, default=10.0)
+    parser.add_argument('--chunk-size', type=int, default=64 * 1024,
+                        help='size of the streamed chunks')
+    parser.add_argument('--repeat', type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Seeded datasets of invitations, guests and songs for the benchmarks
+
+The same seed always produces the same documents, so runs against
+different versions of the service load identical data.
+
+    python -m code.benchmarks.datasets --mongodb-url mongodb://localhost
+"""
+
+import argparse
+import asyncio
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from ..database.mongodb import configure_database, get_mock_database
+from ..helpers.search import get_search_key, get_song_key
+from ..helpers.tenancy import DEFAULT_WEDDING_ID
+from ..schemas.invitations import FoodOptionsEnum
+
+
+SEED_BATCH_SIZE = 1000
+LAST_NAMES = ['Pérez', 'García', 'Smith', 'Müller', 'Núñez', 'Rossi',
+              'Dubois', 'Silva', 'Kowalski', 'Johnson']
+
+
+@dataclass
+class Dataset:
+    """Sizes of a dataset and the ids it was seeded with"""
+    invitations: int = 2000
+    guests: int = 10000
+    songs: int = 5000
+    seed: int = 42
+    wedding_id: str = DEFAULT_WEDDING_ID
+    invitation_names: list = field(default_factory=list)
+    # guest ids of each invitation id
+    invitation_guests: dict = field(default_factory=dict)
+
+
+def create_documents(dataset: Dataset):
+    """Invitation, guest and song documents of the dataset"""
+    rng = random.Random(dataset.seed)
+    created_at = datetime(2023, 5, 1, 12, 0, 0)
+    invitations = [{
+        '_id': ObjectId(f'{index:024x}'),
+        'wedding_id': dataset.wedding_id,
+        'name': f'invitation-{index}',
+        'seen': 0,
+        'created_at': created_at,
+    } for index in range(dataset.invitations)]
+
+    guests = []
+    for index in range(dataset.guests):
+        # every invitation gets a guest before any gets a second one
+        invitation = (invitations[index] if index < len(invitations)
+                      else rng.choice(invitations))
+        name = f'Guest {index}'
+        last_name = rng.choice(LAST_NAMES)
+        guests.append({
+            '_id': ObjectId(f'{index + dataset.invitations:024x}'),
+            'wedding_id': dataset.wedding_id,
+            'name': name,
+            'last_name': last_name,
+            'search_key': get_search_key(name, last_name),
+            'is_attending': rng.choice([True, False, None]),
+            'is_pending': rng.choice([True, False]),
+            'is_kid': rng.random() < 0.2,
+            'menu': rng.choice(list(FoodOptionsEnum)).value,
+            'invitation_id': invitation['_id'],
+            'with_plus_one': rng.random() < 0.1,
+            'is_plus_one': False,
+            'created_at': created_at + timedelta(milliseconds=index),
+        })
+
+    songs = [{
+        'wedding_id': dataset.wedding_id,
+        'name': f'Song {rng.randrange(dataset.songs)}',
+        'invitation_id': rng.choice(invitations)['_id'],
+        'created_at': created_at + timedelta(milliseconds=index),
+    } for index in range(dataset.songs)] if invitations else []
+    for song in songs:
+        song['name_key'] = get_song_key(song['name'])
+    return invitations, guests, songs
+
+
+async def insert_in_batches(collection, documents: list[dict]):
+    """Inserts the documents SEED_BATCH_SIZE at a time"""
+    for start in range(0, len(documents), SEED_BATCH_SIZE):
+        await collection.insert_many(documents[start:start + SEED_BATCH_SIZE],
+                                     ordered=False)
+
+
+async def seed_database(database, dataset: Dataset) -> Dataset:
+    """Replaces the collections with the dataset documents"""
+    invitations, guests, songs = create_documents(dataset)
+    for collection in ('invitations', 'guests', 'songs'):
+        await database.drop_collection(collection)
+    await configure_database(database)
+    await insert_in_batches(database.invitations, invitations)
+    await insert_in_batches(database.guests, guests)
+    await insert_in_batches(database.songs, songs)
+
+    dataset.invitation_names = [invitation['name']
+                                for invitation in invitations]
+    dataset.invitation_guests = {}
+    for guest in guests:
+        dataset.invitation_guests.setdefault(
+            str(guest['invitation_id']), []).append(str(guest['_id']))
+    return dataset
+
+
+def add_dataset_arguments(parser: argparse.ArgumentParser):
+    """Command line options of the dataset sizes"""
+    parser.add_argument('--invitations', type=int, default=2000)
+    parser.add_argument('--guests', type=int, default=10000)
+    parser.add_argument('--songs', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--mongodb-url', default=None,
+                        help='local mongod to seed, mongomock without it')
+    parser.add_argument('--mongodb-db-name', default='benchmark')
+
+
+def get_benchmark_database(args):
+    """Database of the command line options"""
+    if args.mongodb_url is None:
+        return get_mock_database(args.mongodb_db_name)
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+    return AsyncIOMotorClient(args.mongodb_url)[args.mongodb_db_name]
+
+
+def main():
+    """Command line entrypoint"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_dataset_arguments(parser)
+    args = parser.parse_args()
+    dataset = Dataset(args.invitations, args.guests, args.songs, args.seed)
+    asyncio.run(seed_database(get_benchmark_database(args), dataset))
+    print(f'seeded {dataset.invitations} invitations, {dataset.guests} '
+          f'guests and {dataset.songs} songs')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark of the time needed to import the application
+
+Runs python -X importtime in a fresh interpreter, reports the slowest
+modules and fails when the import goes over the budget or loads a test
+only dependency.
+
+    python -m code.benchmarks.import_time --budget-ms 600
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+from decouple import config
+
+
+IMPORT_TIME_BUDGET_MS = config('IMPORT_TIME_BUDGET_MS', default=600,
+                               cast=int)
+FORBIDDEN_MODULES = ('mongomock', 'mongomock_motor')
+
+
+def measure_import(module: str) -> dict[str, tuple[int, int]]:
+    """Self and cumulative microseconds of every module imported"""
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=package_root, capture_output=True, text=True, check=True)
+
+    modules = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_time), int(cumulative))
+    return modules
+
+
+def main():
+    """Command line entrypoint"""
+    package = __package__.rsplit('.', 1)[0]
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default=f'{package}.main')
+    parser.add_argument('--budget-ms', type=int,
+                        default=IMPORT_TIME_BUDGET_MS)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    # the fastest run is the least affected by noise
+    runs = [measure_import(args.module) for _ in range(args.runs)]
+    modules = min(runs, key=lambda run: run[args.module][1])
+    total_ms = modules[args.module][1] / 1000
+
+    print(f'{args.module}: {total_ms:.1f} ms '
+          f'(budget {args.budget_ms} ms, {len(modules)} modules)')
+    print(f'{"self ms":>9} {"cumulative ms":>14}  module')
+    slowest = sorted(modules.items(), key=lambda item: item[1][0],
+                     reverse=True)[:args.top]
+    for name, (self_time, cumulative) in slowest:
+        print(f'{self_time / 1000:>9.1f} {cumulative / 1000:>14.1f}  {name}')
+
+    failures = [f'{name} is imported' for name in FORBIDDEN_MODULES
+                if name in modules]
+    if total_ms > args.budget_ms:
+        failures.append(f'import takes {total_ms:.1f} ms, '
+                        f'over the {args.budget_ms} ms budget')
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
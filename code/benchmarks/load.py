@@ -0,0 +1,194 @@
+"""Load test of the main endpoints against a seeded dataset
+
+Drives the ASGI app in process at a fixed concurrency and reports the
+latency percentiles and throughput of each endpoint as JSON. With
+--baseline the run fails when an endpoint p95 regressed more than the
+tolerance.
+
+    python -m code.benchmarks.load --requests 500 --concurrency 20 \\
+        --output results.json --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import httpx
+
+from ..database.mongodb import get_database
+from ..main import app
+from ..schemas.invitations import FoodOptionsEnum
+from .datasets import Dataset, add_dataset_arguments, get_benchmark_database
+from .datasets import seed_database
+
+
+# the endpoints only check the header is present
+AUTHORIZATION = {'Authorization': 'Bearer benchmark'}
+
+
+def list_invitations(rng: random.Random, dataset: Dataset):
+    """Request of the first invitations page"""
+    return 'GET', '/invitations/', {'params': {'limit': 100}}
+
+
+def count_guests(rng: random.Random, dataset: Dataset):
+    """Request of the guest counters"""
+    return 'GET', '/guests/count', {}
+
+
+def get_invitation_by_name(rng: random.Random, dataset: Dataset):
+    """Request of a random invitation by name"""
+    name = rng.choice(dataset.invitation_names)
+    return 'GET', f'/invitations/by_name/{name}', {}
+
+
+def confirm_guests(rng: random.Random, dataset: Dataset):
+    """Request confirming every guest of a random invitation"""
+    invitation_id = rng.choice(list(dataset.invitation_guests))
+    guests = [{'_id': guest_id, 'is_attending': rng.choice([True, False]),
+               'menu': FoodOptionsEnum.NO_RESTRICTION.value}
+              for guest_id in dataset.invitation_guests[invitation_id]]
+    return 'POST', f'/invitations/{invitation_id}/guests/confirm', {
+        'json': {'guests': guests, 'new_guests': []}}
+
+
+def get_top_songs(rng: random.Random, dataset: Dataset):
+    """Request of the most requested songs"""
+    return 'GET', '/songs/top', {'params': {'limit': 20}}
+
+
+ENDPOINTS = {
+    '/invitations/': list_invitations,
+    '/guests/count': count_guests,
+    '/invitations/by_name/{name}': get_invitation_by_name,
+    '/invitations/{id}/guests/confirm': confirm_guests,
+    '/songs/top': get_top_songs,
+}
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Nearest rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    rank = max(int(round(percent / 100 * len(values))) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+async def run_endpoint(client: httpx.AsyncClient, create_request,
+                       dataset: Dataset, requests: int, concurrency: int,
+                       seed: int) -> dict:
+    """Sends requests with concurrency workers and summarizes them"""
+    rng = random.Random(seed)
+    pending = [create_request(rng, dataset) for _ in range(requests)]
+    pending.reverse()
+    latencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while pending:
+            method, url, options = pending.pop()
+            start = time.perf_counter()
+            response = await client.request(method, url, **options)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'throughput_rps': round(requests / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+async def run(args) -> dict:
+    """Seeds the database and load tests every selected endpoint"""
+    database = get_benchmark_database(args)
+    dataset = await seed_database(database, Dataset(
+        args.invitations, args.guests, args.songs, args.seed))
+    app.dependency_overrides[get_database] = lambda: database
+
+    results = {}
+    async with httpx.AsyncClient(
+            app=app, base_url='http://benchmark',
+            headers=AUTHORIZATION | {'X-Wedding-Id': dataset.wedding_id}
+    ) as client:
+        for name in args.endpoints:
+            # warm up caches and code paths outside the measurement
+            await run_endpoint(client, ENDPOINTS[name], dataset,
+                               min(args.concurrency, args.requests),
+                               args.concurrency, args.seed)
+            results[name] = await run_endpoint(
+                client, ENDPOINTS[name], dataset, args.requests,
+                args.concurrency, args.seed)
+            print(f'{name}: ' + ', '.join(
+                f'{key} {value}' for key, value in results[name].items()),
+                file=sys.stderr)
+
+    app.dependency_overrides.pop(get_database, None)
+    return {
+        'dataset': {'invitations': args.invitations, 'guests': args.guests,
+                    'songs': args.songs, 'seed': args.seed,
+                    'database': 'mongod' if args.mongodb_url else 'mongomock'},
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'results': results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Endpoints whose p95 regressed more than tolerance"""
+    regressions = []
+    for name, result in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous['p95_ms']:
+            continue
+        change = result['p95_ms'] / previous['p95_ms'] - 1
+        print(f'{name}: p95 {previous["p95_ms"]} -> {result["p95_ms"]} ms '
+              f'({change:+.1%})', file=sys.stderr)
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    """Command line entrypoint"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_dataset_arguments(parser)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--endpoints', nargs='+', choices=list(ENDPOINTS),
+                        default=list(ENDPOINTS))
+    parser.add_argument('--output', help='file to write the JSON results')
+    parser.add_argument('--baseline', help='JSON results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed p95 regression, 0.2 is 20%%')
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        if regressions:
+            sys.exit(f'p95 regressions: {", ".join(regressions)}')
+
+
+if __name__ == '__main__':
+    main()
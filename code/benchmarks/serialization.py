@@ -0,0 +1,120 @@
+"""Benchmark of the list responses serialization
+
+Compares the response_model path with MongoJSONResponse on documents
+shaped like the ones returned by mongo and checks both bodies are equal.
+
+    python -m code.benchmarks.serialization --guests 10000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from ..helpers.serializers import MongoJSONResponse, serialize_documents
+from ..helpers.tenancy import DEFAULT_WEDDING_ID
+from ..schemas.invitations import FoodOptionsEnum, GuestGet, InvitationGet
+
+
+def create_guests(count: int, invitation_ids: list) -> list[dict]:
+    """Guest documents as stored by the service"""
+    created_at = datetime(2023, 5, 1, 12, 0, 0)
+    guests = []
+    for index in range(count):
+        guests.append({
+            '_id': ObjectId(),
+            'wedding_id': DEFAULT_WEDDING_ID,
+            'name': f'Guest {index}',
+            'last_name': random.choice(['Pérez', 'García', 'Smith']),
+            'is_attending': random.choice([True, False, None]),
+            'is_pending': random.choice([True, False]),
+            'is_kid': random.random() < 0.2,
+            'menu': random.choice(list(FoodOptionsEnum)).value,
+            'invitation_id': random.choice(invitation_ids),
+            'with_plus_one': random.random() < 0.1,
+            'is_plus_one': random.random() < 0.05,
+            'created_at': created_at + timedelta(milliseconds=index),
+        })
+    return guests
+
+
+def create_invitations(guests: list[dict], invitation_ids: list) -> list[dict]:
+    """Invitation documents with their guests attached"""
+    invitations = {invitation_id: {
+        '_id': invitation_id,
+        'wedding_id': DEFAULT_WEDDING_ID,
+        'name': f'Invitation {index}',
+        'seen': index % 7,
+        'created_at': datetime(2023, 4, 1, 9, 30, 0),
+        'guests': [],
+    } for index, invitation_id in enumerate(invitation_ids)}
+    for guest in guests:
+        invitations[guest['invitation_id']]['guests'].append(guest)
+    return list(invitations.values())
+
+
+async def render_response_model(documents, model) -> bytes:
+    """Body produced by FastAPI for response_model=list[model]"""
+    field = create_response_field(name='Response', type_=list[model])
+    content = await serialize_response(field=field,
+                                       response_content=documents)
+    return JSONResponse(content).body
+
+
+def render_fast(documents, model) -> bytes:
+    """Body produced by MongoJSONResponse"""
+    return MongoJSONResponse(serialize_documents(documents, model)).body
+
+
+async def measure(function, *args, repeat: int = 5):
+    """Best time of several runs and the result of the last one"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        if hasattr(result, '__await__'):
+            result = await result
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+async def run(guest_count: int, invitation_count: int, repeat: int):
+    """Runs the benchmark for guests and invitations lists"""
+    invitation_ids = [ObjectId() for _ in range(invitation_count)]
+    guests = create_guests(guest_count, invitation_ids)
+    invitations = create_invitations(guests, invitation_ids)
+
+    for name, documents, model in [('guests', guests, GuestGet),
+                                   ('invitations', invitations,
+                                    InvitationGet)]:
+        model_time, model_body = await measure(
+            render_response_model, documents, model, repeat=repeat)
+        fast_time, fast_body = await measure(
+            render_fast, documents, model, repeat=repeat)
+        if model_body != fast_body:
+            raise AssertionError(f'{name} bodies are different')
+        print(f'{name}: {len(documents)} documents, {len(fast_body)} bytes, '
+              f'response_model {model_time * 1000:.1f} ms, '
+              f'orjson {fast_time * 1000:.1f} ms, '
+              f'speedup {model_time / fast_time:.1f}x')
+
+
+def main():
+    """Command line entrypoint"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--guests', type=int, default=10000)
+    parser.add_argument('--invitations', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.guests, args.invitations, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Read-through cache for the guest facing invitation lookups"""
+
+import bson
+from cachetools import TTLCache
+from decouple import config
+
+
+CACHE_BACKEND = config('CACHE_BACKEND', default='memory')
+CACHE_REDIS_URL = config('CACHE_REDIS_URL', default='redis://localhost:6379')
+CACHE_MAX_SIZE = config('CACHE_MAX_SIZE', default=1024, cast=int)
+CACHE_TTL = config('CACHE_TTL', default=60, cast=int)
+CACHE_KEY_PREFIX = 'invitations-cache:'
+# Scope of the reports computed from every guest of a wedding
+REPORT_SCOPE = 'guests-report'
+# Scope of the rankings computed from every song of a wedding
+SONG_RANKING_SCOPE = 'songs-ranking'
+
+
+def get_report_scope(wedding_id: str) -> str:
+    """Cache scope of the reports of a wedding"""
+    return f'{REPORT_SCOPE}:{wedding_id}'
+
+
+def get_song_ranking_scope(wedding_id: str) -> str:
+    """Cache scope of the song rankings of a wedding"""
+    return f'{SONG_RANKING_SCOPE}:{wedding_id}'
+
+
+class MemoryBackend:
+    """In process backend bounded by size and time to live"""
+
+    def __init__(self, max_size: int = CACHE_MAX_SIZE, ttl: int = CACHE_TTL):
+        self.scopes = TTLCache(maxsize=max_size, ttl=ttl)
+
+    async def get(self, scope: str, key: str):
+        """Returns the value stored for key in scope"""
+        return self.scopes.get(scope, {}).get(key)
+
+    async def set(self, scope: str, key: str, value: bytes):
+        """Stores the value for key in scope"""
+        values = self.scopes.get(scope)
+        if values is None:
+            values = self.scopes[scope] = {}
+        values[key] = value
+
+    async def delete(self, scope: str):
+        """Removes every value of scope"""
+        self.scopes.pop(scope, None)
+
+
+class RedisBackend:
+    """Backend storing each scope as a hash in a Redis compatible server"""
+
+    def __init__(self, client, ttl: int = CACHE_TTL):
+        self.client = client
+        self.ttl = ttl
+
+    async def get(self, scope: str, key: str):
+        """Returns the value stored for key in scope"""
+        return await self.client.hget(CACHE_KEY_PREFIX + scope, key)
+
+    async def set(self, scope: str, key: str, value: bytes):
+        """Stores the value for key in scope"""
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.hset(CACHE_KEY_PREFIX + scope, key, value)
+            pipe.expire(CACHE_KEY_PREFIX + scope, self.ttl)
+            await pipe.execute()
+
+    async def delete(self, scope: str):
+        """Removes every value of scope"""
+        await self.client.delete(CACHE_KEY_PREFIX + scope)
+
+
+class InvitationCache:
+    """Cache of documents grouped by the invitation they belong to"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, scope, key: str):
+        """Returns the cached value or None"""
+        data = await self.backend.get(str(scope), key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return bson.decode(data)['value']
+
+    async def set(self, scope, key: str, value):
+        """Stores a copy of value"""
+        await self.backend.set(str(scope), key, bson.encode({'value': value}))
+
+    async def invalidate(self, *scopes):
+        """Removes every cached value of the scopes"""
+        for scope in set(scopes):
+            if scope is not None:
+                await self.backend.delete(str(scope))
+
+    def stats(self) -> dict:
+        """Hit and miss counts"""
+        return {'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses}
+
+
+def create_cache() -> InvitationCache:
+    """Creates the cache with the configured backend"""
+    if CACHE_BACKEND == 'redis':
+        from redis import asyncio as redis
+        return InvitationCache(RedisBackend(redis.from_url(CACHE_REDIS_URL)))
+    return InvitationCache(MemoryBackend())
+
+
+CACHE = create_cache()
+
+
+def get_cache() -> InvitationCache:
+    """Returns the invitations cache"""
+    return CACHE
@@ -0,0 +1,180 @@
+"""Write-behind buffer for the invitation seen counters"""
+
+import asyncio
+import logging
+import time
+from collections import Counter
+
+from decouple import config
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+
+
+SEEN_BUFFER_ENABLED = config('SEEN_BUFFER_ENABLED', default=False, cast=bool)
+SEEN_BUFFER_INTERVAL = config('SEEN_BUFFER_INTERVAL', default=1.0,
+                              cast=float)
+SEEN_BUFFER_SIZE = config('SEEN_BUFFER_SIZE', default=500, cast=int)
+
+logger = logging.getLogger(__name__)
+
+
+class SeenCounterBuffer:
+    """Aggregates seen increments per invitation and flushes them in bulk
+
+    Increments are keyed by (wedding_id, invitation_id) so each update
+    is routed to the shard of its wedding.
+    """
+
+    def __init__(self, database, interval: float = SEEN_BUFFER_INTERVAL,
+                 max_size: int = SEEN_BUFFER_SIZE):
+        self.database = database
+        self.interval = interval
+        self.max_size = max_size
+        self.pending = Counter()
+        self.flushing = Counter()
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self._lock = asyncio.Lock()
+        self._stopping = asyncio.Event()
+        self._task = None
+        self._flush_tasks = set()
+
+    @property
+    def depth(self) -> int:
+        """Increments waiting to be written"""
+        return sum(self.pending.values())
+
+    def increment(self, key: tuple):
+        """Adds 1 to the seen counter of an invitation"""
+        self.pending[key] += 1
+        if self.depth >= self.max_size and not self._lock.locked():
+            task = asyncio.create_task(self._flush_logged())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    def unflushed(self, key: tuple) -> int:
+        """Increments of an invitation not yet stored in the database"""
+        return self.pending[key] + self.flushing[key]
+
+    async def flush(self):
+        """Writes the buffered increments with one bulk write"""
+        async with self._lock:
+            self.flushing, self.pending = self.pending, Counter()
+            if not self.flushing:
+                return
+
+            start = time.perf_counter()
+            keys = list(self.flushing)
+            try:
+                await self.database.invitations.bulk_write(
+                    [UpdateOne({'wedding_id': wedding_id,
+                                '_id': invitation_id},
+                               {'$inc': {'seen': increments}})
+                     for (wedding_id, invitation_id), increments
+                     in self.flushing.items()],
+                    ordered=False)
+            except BulkWriteError as error:
+                # the other updates were applied, keep only the failed ones
+                for write_error in error.details['writeErrors']:
+                    key = keys[write_error['index']]
+                    self.pending[key] += self.flushing[key]
+                raise
+            except (PyMongoError, asyncio.CancelledError):
+                # keep the increments for the next flush
+                self.pending.update(self.flushing)
+                raise
+            finally:
+                self.flushing = Counter()
+                self.last_flush_seconds = time.perf_counter() - start
+                self.max_flush_seconds = max(self.max_flush_seconds,
+                                             self.last_flush_seconds)
+            self.flushes += 1
+
+    async def _flush_logged(self):
+        """Flushes the buffer, a failure is logged and retried later"""
+        try:
+            await self.flush()
+        except PyMongoError as error:
+            logger.warning('Seen counters flush failed: %s', error)
+
+    async def run(self):
+        """Flushes the buffer every interval until it is stopped"""
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self._flush_logged()
+
+    def start(self):
+        """Starts the periodic flush"""
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stops the periodic flush and writes what is left"""
+        # a flush in flight is awaited, cancelling it would lose its
+        # increments
+        self._stopping.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self.flush()
+
+    def stats(self) -> dict:
+        """Buffer depth and flush latency"""
+        return {
+            'depth': self.depth,
+            'invitations': len(self.pending),
+            'flushes': self.flushes,
+            'last_flush_seconds': self.last_flush_seconds,
+            'max_flush_seconds': self.max_flush_seconds,
+        }
+
+
+SEEN_BUFFER = None
+
+
+def get_seen_buffer():
+    """Returns the seen counter buffer, None when it is disabled"""
+    return SEEN_BUFFER
+
+
+def start_seen_buffer(database):
+    """Creates the seen counter buffer if it is enabled"""
+    global SEEN_BUFFER
+    if SEEN_BUFFER_ENABLED and database is not None:
+        SEEN_BUFFER = SeenCounterBuffer(database)
+        SEEN_BUFFER.start()
+
+
+async def stop_seen_buffer():
+    """Flushes and removes the seen counter buffer"""
+    global SEEN_BUFFER
+    if SEEN_BUFFER is not None:
+        await SEEN_BUFFER.stop()
+        SEEN_BUFFER = None
+
+
+async def add_view(database, seen_buffer, query: dict, read_invitation):
+    """Adds 1 to the seen counter of the invitation matching query
+
+    Without a buffer each view is one find_one_and_update returning the
+    invitation. With it the invitation comes from read_invitation(),
+    which may share the read between concurrent views.
+    """
+    if seen_buffer is None:
+        return await database.invitations.find_one_and_update(
+            query,
+            {'$inc': {'seen': 1}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    invitation = await read_invitation()
+    if invitation:
+        key = (invitation['wedding_id'], invitation['_id'])
+        seen_buffer.increment(key)
+        invitation['seen'] = (invitation.get('seen', 0)
+                              + seen_buffer.unflushed(key))
+    return invitation
@@ -0,0 +1,187 @@
+"""Guests embedded in their invitation documents
+
+With DENORMALIZED_INVITATIONS enabled each invitation stores its guests,
+so the guest facing reads are a single document fetch. The embedded
+guests are refreshed by the guest write routes, or by a change stream
+consumer with DENORMALIZED_SYNC=change_stream on a replica set.
+
+Guest writes increment the guests_version of their invitations and the
+embedded copy stores the guests_version it was taken at as
+guests_revision. The copy is only read while both are equal, so a copy
+lagging behind a write is never served.
+"""
+
+import asyncio
+import logging
+
+from bson import ObjectId
+from decouple import config
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from ..schemas.invitations import GuestGet
+from .mongodb import supports_transactions
+
+
+DENORMALIZED_INVITATIONS = config('DENORMALIZED_INVITATIONS', default=False,
+                                  cast=bool)
+# writes or change_stream
+DENORMALIZED_SYNC = config('DENORMALIZED_SYNC', default='writes')
+# Fields of the embedded guests, the ones returned by the API
+EMBEDDED_GUEST_PROJECTION = {field.alias: 1
+                             for field in GuestGet.__fields__.values()}
+
+logger = logging.getLogger(__name__)
+
+
+async def load_guests(database, invitations, session=None) -> dict:
+    """Guests of each invitation with a single query"""
+    guests = {invitation['_id']: [] for invitation in invitations}
+    cursor = database.guests.find(
+        {'wedding_id': {'$in': list({invitation['wedding_id']
+                                     for invitation in invitations})},
+         'invitation_id': {'$in': list(guests)}},
+        EMBEDDED_GUEST_PROJECTION, session=session).sort('_id')
+    async for guest in cursor:
+        guests[guest['invitation_id']].append(guest)
+    return guests
+
+
+def get_guests_version(invitation: dict) -> int:
+    """Number of guest writes of an invitation"""
+    return invitation.get('guests_version', 0)
+
+
+async def write_embedded_guests(database, wedding_id, *invitation_ids,
+                                session=None):
+    """Copies the current guests into their invitations
+
+    wedding_id may be None when it is unknown, the invitations are then
+    looked up in every wedding.
+    """
+    ids = list({ObjectId(invitation_id) for invitation_id in invitation_ids
+                if ObjectId.is_valid(invitation_id)})
+    if not ids:
+        return
+
+    # guest writes bump guests_version before calling this, so a snapshot
+    # taken after reading version v has every write up to v and an older
+    # snapshot never replaces a newer one
+    query = {'_id': {'$in': ids}}
+    if wedding_id is not None:
+        query['wedding_id'] = wedding_id
+    invitations = await database.invitations.find(
+        query, {'wedding_id': 1, 'guests_version': 1},
+        session=session).to_list(length=None)
+    guests = await load_guests(database, invitations, session=session)
+    operations = [UpdateOne(
+        {'wedding_id': invitation['wedding_id'], '_id': invitation['_id'],
+         '$or': [{'guests_revision': {'$lt': get_guests_version(invitation)}},
+                 {'guests_revision': {'$exists': False}}]},
+        {'$set': {'guests': guests[invitation['_id']],
+                  'guests_revision': get_guests_version(invitation)}})
+        for invitation in invitations]
+    if operations:
+        await database.invitations.bulk_write(operations, ordered=False,
+                                              session=session)
+
+
+async def refresh_embedded_guests(database, wedding_id: str,
+                                  *invitation_ids, session=None):
+    """Refreshes the embedded guests after a guest write, when enabled"""
+    # the change stream consumer refreshes them when it is running
+    if DENORMALIZED_INVITATIONS and EMBEDDED_GUESTS_WATCHER is None:
+        await write_embedded_guests(database, wedding_id, *invitation_ids,
+                                    session=session)
+
+
+def has_embedded_guests(invitation: dict) -> bool:
+    """Checks if the guests of an invitation can be read from it"""
+    # between a guest write and its refresh the copy lags behind
+    return (DENORMALIZED_INVITATIONS and 'guests' in invitation
+            and invitation.get('guests_revision')
+            == get_guests_version(invitation))
+
+
+class EmbeddedGuestsWatcher:
+    """Refreshes the embedded guests from the guests change stream"""
+
+    def __init__(self, database):
+        self.database = database
+        self._task = None
+
+    @staticmethod
+    def get_changed_wedding(change: dict):
+        """Wedding of the changed guest, None when it is unknown"""
+        # the document key of a sharded collection has the shard key too
+        document = change.get('fullDocument') or {}
+        return (change['documentKey'].get('wedding_id')
+                or document.get('wedding_id'))
+
+    async def get_changed_invitations(self, change: dict) -> set:
+        """Invitations a guest belongs to before and after a change"""
+        invitation_ids = set()
+        document = change.get('fullDocument') or {}
+        if document.get('invitation_id'):
+            invitation_ids.add(document['invitation_id'])
+        # deleted and moved guests are still embedded in the old invitation
+        query = {'guests._id': change['documentKey']['_id']}
+        wedding_id = self.get_changed_wedding(change)
+        if wedding_id:
+            query['wedding_id'] = wedding_id
+        async for invitation in self.database.invitations.find(
+                query, {'_id': 1}):
+            invitation_ids.add(invitation['_id'])
+        return invitation_ids
+
+    async def run(self):
+        """Consumes the change stream until it is cancelled"""
+        while True:
+            try:
+                async with self.database.guests.watch(
+                        full_document='updateLookup') as stream:
+                    async for change in stream:
+                        invitation_ids = await self.get_changed_invitations(
+                            change)
+                        await write_embedded_guests(
+                            self.database, self.get_changed_wedding(change),
+                            *invitation_ids)
+            except PyMongoError as error:
+                logger.warning('Embedded guests change stream failed: %s',
+                               error)
+                await asyncio.sleep(1)
+
+    def start(self):
+        """Starts consuming the change stream"""
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        """Stops consuming the change stream"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+EMBEDDED_GUESTS_WATCHER = None
+
+
+def start_embedded_guests_watcher(database):
+    """Starts the change stream consumer when it is configured"""
+    global EMBEDDED_GUESTS_WATCHER
+    if (not DENORMALIZED_INVITATIONS or DENORMALIZED_SYNC != 'change_stream'
+            or database is None):
+        return
+    if not supports_transactions(database):
+        logger.warning('Change streams need a replica set, embedded guests '
+                       'are refreshed by the write routes')
+        return
+    EMBEDDED_GUESTS_WATCHER = EmbeddedGuestsWatcher(database)
+    EMBEDDED_GUESTS_WATCHER.start()
+
+
+async def stop_embedded_guests_watcher():
+    """Stops the change stream consumer"""
+    global EMBEDDED_GUESTS_WATCHER
+    if EMBEDDED_GUESTS_WATCHER is not None:
+        await EMBEDDED_GUESTS_WATCHER.stop()
+        EMBEDDED_GUESTS_WATCHER = None
@@ -1,7 +1,90 @@
 """Utils module to configure indexes"""
 
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 
-def configure_database_indexes(database):
+
+# Every route query is scoped to a wedding, so their indexes start with
+# wedding_id and it is also the shard key
+SHARD_KEY = {'wedding_id': 1}
+
+INDEXES = {
+    'invitations': [
+        IndexModel([('wedding_id', ASCENDING), ('name', ASCENDING)],
+                   unique=True),
+        # pages sorted by _id
+        IndexModel([('wedding_id', ASCENDING), ('_id', ASCENDING)]),
+        # invitations embedding a guest, used by the change stream consumer,
+        # delete events of an unsharded collection have no wedding_id
+        IndexModel([('guests._id', ASCENDING)]),
+    ],
+    'guests': [
+        IndexModel([('wedding_id', ASCENDING), ('invitation_id', ASCENDING)]),
+        IndexModel([('wedding_id', ASCENDING), ('name', ASCENDING),
+                    ('last_name', ASCENDING)]),
+        IndexModel([('wedding_id', ASCENDING), ('search_key', ASCENDING)]),
+        IndexModel([('wedding_id', ASCENDING), ('_id', ASCENDING)]),
+    ],
+    'songs': [
+        IndexModel([('wedding_id', ASCENDING), ('invitation_id', ASCENDING)]),
+        # requests of the same song, grouped by the ranking
+        IndexModel([('wedding_id', ASCENDING), ('name_key', ASCENDING)]),
+        IndexModel([('wedding_id', ASCENDING), ('_id', ASCENDING)]),
+    ],
+}
+
+# Representative filter of every lookup made by the routes, checked with
+# explain() so a missing index shows up as a COLLSCAN
+ROUTE_QUERIES = [
+    ('invitations', {'wedding_id': '', 'name': ''}),
+    ('invitations', {'wedding_id': '', '_id': {'$gt': ObjectId()}}),
+    ('invitations', {'guests._id': ObjectId()}),
+    ('guests', {'wedding_id': '', 'invitation_id': {'$in': [ObjectId()]}}),
+    ('guests', {'wedding_id': '', 'name': '', 'last_name': ''}),
+    ('guests', {'wedding_id': '', 'search_key': {'$gte': 'a', '$lt': 'b'}}),
+    ('guests', {'wedding_id': '', '_id': {'$gt': ObjectId()}}),
+    ('songs', {'wedding_id': '', 'invitation_id': ObjectId()}),
+    ('songs', {'wedding_id': '', 'name_key': {'$ne': None}}),
+    ('songs', {'wedding_id': '', '_id': {'$gt': ObjectId()}}),
+]
+
+
+async def configure_database_indexes(database):
     """Indixes for filters"""
     if database is not None:
-        pass
+        for collection, indexes in INDEXES.items():
+            await database[collection].create_indexes(indexes)
+
+
+async def shard_collections(database):
+    """Shards every collection by SHARD_KEY, needs a sharded cluster"""
+    admin = database.client.admin
+    await admin.command('enableSharding', database.name)
+    for collection in INDEXES:
+        await admin.command('shardCollection',
+                            f'{database.name}.{collection}', key=SHARD_KEY)
+    return len(INDEXES)
+
+
+def get_plan_stages(plan):
+    """Returns every stage name of a query plan"""
+    stages = [plan.get('stage')]
+    for child in plan.get('inputStages', []):
+        stages += get_plan_stages(child)
+    if 'inputStage' in plan:
+        stages += get_plan_stages(plan['inputStage'])
+    return stages
+
+
+async def verify_database_indexes(database):
+    """Raises an error if any route query needs a collection scan"""
+    collection_scans = []
+    for collection, query in ROUTE_QUERIES:
+        explain = await database[collection].find(query).explain()
+        plan = explain['queryPlanner']['winningPlan']
+        if 'COLLSCAN' in get_plan_stages(plan.get('queryPlan', plan)):
+            collection_scans.append(f'{collection} {query}')
+
+    if collection_scans:
+        raise RuntimeError(
+            'Queries without index: ' + ', '.join(collection_scans))
@@ -0,0 +1,182 @@
+"""Data migrations, run them with python -m <package>.database.migrations"""
+
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+from ..helpers.search import get_search_key, get_song_key
+from ..helpers.tenancy import DEFAULT_WEDDING_ID
+from .denormalized import get_guests_version, load_guests
+from .indexes import INDEXES, configure_database_indexes, shard_collections
+from .mongodb import close_database, connect_database
+
+
+MIGRATION_BATCH_SIZE = 500
+# Indexes replaced by the ones in INDEXES, dropped by assign_default_wedding
+LEGACY_INDEXES = {
+    'invitations': ['name_1', 'wedding_id_1_guests._id_1'],
+    'guests': ['invitation_id_1', 'name_1_last_name_1', 'search_key_1'],
+    'songs': ['invitation_id_1'],
+}
+
+
+async def write_in_batches(collection, updates):
+    """Sends an async iterable of updates as bulk writes"""
+    modified = 0
+    operations = []
+    async for operation in updates:
+        operations.append(operation)
+        if len(operations) == MIGRATION_BATCH_SIZE:
+            result = await collection.bulk_write(operations, ordered=False)
+            modified += result.modified_count
+            operations = []
+    if operations:
+        result = await collection.bulk_write(operations, ordered=False)
+        modified += result.modified_count
+    return modified
+
+
+async def backfill_guest_search_keys(database, only_missing: bool = True):
+    """Sets the normalized search key of the guests"""
+    query = {'search_key': {'$exists': False}} if only_missing else {}
+
+    async def updates():
+        async for guest in database.guests.find(
+                query, {'wedding_id': 1, 'name': 1, 'last_name': 1}):
+            yield UpdateOne({'wedding_id': guest.get('wedding_id'),
+                             '_id': guest['_id']}, {'$set': {
+                'search_key': get_search_key(guest.get('name'),
+                                             guest.get('last_name'))}})
+
+    return await write_in_batches(database.guests, updates())
+
+
+async def backfill_song_name_keys(database, only_missing: bool = True):
+    """Sets the normalized name key of the songs"""
+    query = {'name_key': {'$exists': False}} if only_missing else {}
+
+    async def updates():
+        async for song in database.songs.find(
+                query, {'wedding_id': 1, 'name': 1}):
+            yield UpdateOne({'wedding_id': song.get('wedding_id'),
+                             '_id': song['_id']}, {'$set': {
+                'name_key': get_song_key(song.get('name'))}})
+
+    return await write_in_batches(database.songs, updates())
+
+
+async def iterate_embedded_guests(database):
+    """Yields each invitation with its guests read from the guests"""
+    invitations = []
+    async for invitation in database.invitations.find(
+            {}, {'wedding_id': 1, 'guests': 1, 'guests_revision': 1,
+                 'guests_version': 1}):
+        invitations.append(invitation)
+        if len(invitations) == MIGRATION_BATCH_SIZE:
+            guests = await load_guests(database, invitations)
+            for invitation in invitations:
+                yield invitation, guests[invitation['_id']]
+            invitations = []
+    if invitations:
+        guests = await load_guests(database, invitations)
+        for invitation in invitations:
+            yield invitation, guests[invitation['_id']]
+
+
+async def rebuild_embedded_guests(database):
+    """Regenerates the guests embedded in every invitation"""
+    async def updates():
+        async for invitation, guests in iterate_embedded_guests(database):
+            yield UpdateOne({'wedding_id': invitation.get('wedding_id'),
+                             '_id': invitation['_id']}, {'$set': {
+                'guests': guests,
+                'guests_revision': get_guests_version(invitation)}})
+
+    return await write_in_batches(database.invitations, updates())
+
+
+async def check_embedded_guests(database):
+    """Counts the invitations whose embedded guests are out of date"""
+    mismatches = 0
+    async for invitation, guests in iterate_embedded_guests(database):
+        if invitation.get('guests') != guests:
+            print(f'invitation {invitation["_id"]}: embedded guests differ')
+            mismatches += 1
+        elif invitation.get('guests_revision') != get_guests_version(
+                invitation):
+            # equal guests but the copy is not read until it is rebuilt
+            print(f'invitation {invitation["_id"]}: embedded guests '
+                  'version differs')
+            mismatches += 1
+    return mismatches
+
+
+async def assign_default_wedding(database):
+    """Moves the single wedding data to DEFAULT_WEDDING_ID
+
+    Run it before starting the service with several weddings, it also
+    replaces the old indexes with the ones leading with wedding_id.
+    """
+    modified = 0
+    for collection in INDEXES:
+        result = await database[collection].update_many(
+            {'wedding_id': {'$exists': False}},
+            {'$set': {'wedding_id': DEFAULT_WEDDING_ID}})
+        modified += result.modified_count
+        for index in LEGACY_INDEXES.get(collection, []):
+            try:
+                await database[collection].drop_index(index)
+            except OperationFailure:
+                # already dropped or never created
+                pass
+    await configure_database_indexes(database)
+    return modified
+
+
+MIGRATIONS = {
+    'backfill_guest_search_keys': backfill_guest_search_keys,
+    'backfill_song_name_keys': backfill_song_name_keys,
+    'rebuild_embedded_guests': rebuild_embedded_guests,
+    'assign_default_wedding': assign_default_wedding,
+    'shard_collections': shard_collections,
+}
+# Migrations that recompute every document with --all, after a key change
+BACKFILLS = {'backfill_guest_search_keys', 'backfill_song_name_keys'}
+# Read only commands, they exit with an error when they find documents
+CHECKS = {
+    'check_embedded_guests': check_embedded_guests,
+}
+
+
+def main():
+    """Command line entrypoint"""
+    parser = argparse.ArgumentParser(description='Run a data migration')
+    parser.add_argument('migration', choices=MIGRATIONS | CHECKS)
+    parser.add_argument('--all', action='store_true',
+                        help='backfill every document, not only the missing')
+    args = parser.parse_args()
+    if args.all and args.migration not in BACKFILLS:
+        parser.error('--all only applies to ' + ', '.join(sorted(BACKFILLS)))
+    options = {'only_missing': False} if args.all else {}
+
+    database = connect_database()
+    if database is None:
+        parser.error('MONGODB_URL and MONGODB_DB_NAME are required')
+    try:
+        modified = asyncio.run(
+            (MIGRATIONS | CHECKS)[args.migration](database, **options))
+    finally:
+        close_database()
+    if args.migration in CHECKS:
+        if modified:
+            parser.exit(1, f'{args.migration}: {modified} documents '
+                           'out of date\n')
+        print(f'{args.migration}: no documents out of date')
+    else:
+        print(f'{args.migration}: {modified} documents updated')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,34 @@
 """Database client."""
 
-import mongomock
+import asyncio
+
 from decouple import config
-from pymongo import MongoClient
-from .indexes import configure_database_indexes
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from .indexes import configure_database_indexes, verify_database_indexes
+from .monitoring import get_event_listeners
 
 
 MONGODB_URL = config('MONGODB_URL', default=None)
 MONGODB_DB_NAME = config('MONGODB_DB_NAME', default=None)
-
-if MONGODB_URL and MONGODB_DB_NAME:
-    MONGODB = MongoClient(MONGODB_URL,
-                          serverSelectionTimeoutMS=5000)[MONGODB_DB_NAME]
-else:
-    MONGODB = None
+MONGODB_VERIFY_INDEXES = config('MONGODB_VERIFY_INDEXES', default=False,
+                                cast=bool)
+MONGODB_MIN_POOL_SIZE = config('MONGODB_MIN_POOL_SIZE', default=5, cast=int)
+MONGODB_MAX_POOL_SIZE = config('MONGODB_MAX_POOL_SIZE', default=100,
+                               cast=int)
+MONGODB_MAX_IDLE_TIME_MS = config('MONGODB_MAX_IDLE_TIME_MS', default=300000,
+                                  cast=int)
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = config('MONGODB_WAIT_QUEUE_TIMEOUT_MS',
+                                       default=10000, cast=int)
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = config(
+    'MONGODB_SERVER_SELECTION_TIMEOUT_MS', default=5000, cast=int)
+# Comma separated list of zstd, snappy and zlib, empty to disable
+MONGODB_COMPRESSORS = config('MONGODB_COMPRESSORS', default='')
+
+# Topologies where multi-document transactions are available
+TRANSACTION_TOPOLOGIES = ('ReplicaSetWithPrimary', 'Sharded')
+
+MONGODB_CLIENT = None
+MONGODB = None
 
 
 class MongoDB:
@@ -29,21 +44,94 @@ class MongoDB:
         return self.database
 
 
-def get_database() -> MongoClient:
+def get_database() -> AsyncIOMotorDatabase:
     """Returns real database"""
     return MONGODB
 
 
-def get_mock_database() -> MongoClient:
+def connect_database() -> AsyncIOMotorDatabase:
+    """Creates the client with the configured pool, None without url"""
+    global MONGODB_CLIENT, MONGODB
+    if MONGODB_URL and MONGODB_DB_NAME and MONGODB_CLIENT is None:
+        options = {
+            'minPoolSize': MONGODB_MIN_POOL_SIZE,
+            'maxPoolSize': MONGODB_MAX_POOL_SIZE,
+            'maxIdleTimeMS': MONGODB_MAX_IDLE_TIME_MS,
+            'waitQueueTimeoutMS': MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            'serverSelectionTimeoutMS': MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            'event_listeners': get_event_listeners(),
+        }
+        if MONGODB_COMPRESSORS:
+            options['compressors'] = MONGODB_COMPRESSORS
+        MONGODB_CLIENT = AsyncIOMotorClient(MONGODB_URL, **options)
+        MONGODB = MONGODB_CLIENT[MONGODB_DB_NAME]
+    return MONGODB
+
+
+def close_database():
+    """Closes the client and its connections"""
+    global MONGODB_CLIENT, MONGODB
+    if MONGODB_CLIENT is not None:
+        MONGODB_CLIENT.close()
+    MONGODB_CLIENT = None
+    MONGODB = None
+
+
+async def warm_up_database(database):
+    """Opens the minimum pool connections and creates the indexes"""
+    # concurrent commands need one connection each
+    await asyncio.gather(*[database.command('ping')
+                           for _ in range(max(MONGODB_MIN_POOL_SIZE, 1))])
+    await configure_database(database)
+
+
+def get_mock_database(name: str = 'test_user_db') -> AsyncIOMotorDatabase:
     """Returns database for tests"""
-    return mongomock.MongoClient()['test_user_db']
+    # test only dependency, production never imports it
+    from mongomock_motor import AsyncMongoMockClient
+    database = AsyncMongoMockClient()[name]
+
+    # mongomock_motor patches the collection internals again on every
+    # database.<collection> access, which keeps slowing the calls down
+    # until they overflow the stack, so each collection is wrapped once
+    collections = {}
+    get_collection = database.get_collection
+
+    def get_cached_collection(collection_name, *args, **kwargs):
+        if collection_name not in collections:
+            collections[collection_name] = get_collection(
+                collection_name, *args, **kwargs)
+        return collections[collection_name]
+
+    database.get_collection = get_cached_collection
+    return database
+
+
+def supports_transactions(database) -> bool:
+    """Checks if the connected deployment is a replica set or sharded"""
+    description = getattr(database.client, 'topology_description', None)
+    topology = getattr(description, 'topology_type_name', None)
+    # mongomock answers unknown attributes with collections, not strings
+    return isinstance(topology, str) and topology in TRANSACTION_TOPOLOGIES
+
+
+async def run_in_transaction(database, operation):
+    """Runs operation(session) inside a transaction when available"""
+    if not supports_transactions(database):
+        return await operation(None)
+
+    async with await database.client.start_session() as session:
+        async with session.start_transaction():
+            return await operation(session)
 
 
-def configure_database(database):
+async def configure_database(database):
     """Function to create database indexes"""
-    configure_database_indexes(database)
+    await configure_database_indexes(database)
+    if database is not None and MONGODB_VERIFY_INDEXES:
+        await verify_database_indexes(database)
 
 
-def clear_database(database: MongoClient):
+async def clear_database(database: AsyncIOMotorDatabase):
     """Function to drop database between tests"""
-    database.drop_collection('invitations')
+    await database.drop_collection('invitations')
@@ -0,0 +1,77 @@
+"""Command listener tagging each MongoDB command with the current request"""
+
+import logging
+import threading
+
+from decouple import config
+from pymongo import monitoring
+
+from ..helpers.metrics import DB_COMMAND_SECONDS, DB_COMMANDS, REQUEST_STATS
+
+
+MONGODB_MONITOR_COMMANDS = config('MONGODB_MONITOR_COMMANDS', default=True,
+                                  cast=bool)
+# Commands on one collection in one request before warning about N+1 queries
+MONGODB_QUERY_WARNING_THRESHOLD = config('MONGODB_QUERY_WARNING_THRESHOLD',
+                                         default=10, cast=int)
+# Commands whose first value is not a collection name
+UNTARGETED_COMMANDS = ('getMore', 'killCursors')
+
+logger = logging.getLogger(__name__)
+
+
+def get_command_collection(event: monitoring.CommandStartedEvent):
+    """Collection targeted by a command, None for database commands"""
+    if event.command_name in UNTARGETED_COMMANDS:
+        return event.command.get('collection')
+    value = event.command.get(event.command_name)
+    return value if isinstance(value, str) else None
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Counts and times commands by route, command and collection"""
+
+    def __init__(self, threshold: int = MONGODB_QUERY_WARNING_THRESHOLD):
+        self.threshold = threshold
+        self.pending = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        stats = REQUEST_STATS.get()
+        collection = get_command_collection(event)
+        with self._lock:
+            self.pending[event.request_id] = (stats, collection)
+        if stats is None or collection is None:
+            return
+
+        stats.commands[collection] += 1
+        if stats.commands[collection] == self.threshold + 1:
+            logger.warning(
+                'Request %s %s sent more than %d commands to %s, '
+                'possible N+1 queries',
+                stats.scope.get('method'), stats.route, self.threshold,
+                collection)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self.record(event, 'success')
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self.record(event, 'failure')
+
+    def record(self, event, outcome: str):
+        """Adds a finished command to the metrics"""
+        with self._lock:
+            stats, collection = self.pending.pop(event.request_id,
+                                                 (None, None))
+        route = stats.route if stats is not None else ''
+        DB_COMMANDS.inc(route, event.command_name, collection or '', outcome)
+        DB_COMMAND_SECONDS.observe(event.duration_micros / 1e6, route,
+                                   event.command_name)
+
+
+COMMAND_MONITOR = CommandMonitor()
+
+
+def get_event_listeners() -> list:
+    """Listeners to register in the client"""
+    return [COMMAND_MONITOR] if MONGODB_MONITOR_COMMANDS else []
@@ -0,0 +1,24 @@
+"""Revision of the invitations, bumped when their guests or songs change"""
+
+from datetime import datetime
+
+from bson import ObjectId
+
+
+async def touch_invitations(database, wedding_id: str, *invitation_ids,
+                            session=None, guests: bool = True):
+    """Increments the revision and updated_at of invitations of a wedding
+
+    Guest writes also increment guests_version, the version of the guests
+    alone that the embedded copy of the guests is checked against.
+    """
+    ids = list({ObjectId(invitation_id) for invitation_id in invitation_ids
+                if ObjectId.is_valid(invitation_id)})
+    if ids:
+        increments = {'revision': 1}
+        if guests:
+            increments['guests_version'] = 1
+        await database.invitations.update_many(
+            {'wedding_id': wedding_id, '_id': {'$in': ids}},
+            {'$inc': increments, '$set': {'updated_at': datetime.now()}},
+            session=session)
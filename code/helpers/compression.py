@@ -0,0 +1,173 @@
+"""Helper module to compress responses negotiating Accept-Encoding"""
+
+import zlib
+
+from decouple import config
+from starlette.datastructures import Headers, MutableHeaders
+
+
+COMPRESSION_ENABLED = config('COMPRESSION_ENABLED', default=True, cast=bool)
+# Bodies smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+COMPRESSION_GZIP_LEVEL = config('COMPRESSION_GZIP_LEVEL', default=6, cast=int)
+COMPRESSION_BROTLI_QUALITY = config('COMPRESSION_BROTLI_QUALITY', default=4,
+                                    cast=int)
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/x-ndjson',
+                      'application/xml', 'application/javascript')
+# Events must reach the client as soon as they are sent
+UNBUFFERED_TYPES = ('text/event-stream',)
+
+
+def get_brotli():
+    """Returns the brotli module, None when it is not installed"""
+    try:
+        # optional dependency, gzip is used without it
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def parse_accept_encoding(header: str) -> dict:
+    """Quality of each coding of an Accept-Encoding header"""
+    codings = {}
+    for item in header.split(','):
+        coding, _, parameters = item.strip().partition(';')
+        if not coding:
+            continue
+        quality = 1.0
+        name, _, value = parameters.strip().partition('=')
+        if name.strip() == 'q':
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        codings[coding.strip().lower()] = quality
+    return codings
+
+
+def choose_encoding(header: str, brotli_available: bool):
+    """Best supported coding accepted by the client, None for identity"""
+    codings = parse_accept_encoding(header)
+    default = codings.get('*', 0.0)
+    candidates = (['br'] if brotli_available else []) + ['gzip']
+    # the server preference breaks ties between equal qualities
+    best = max(candidates, key=lambda coding: codings.get(coding, default))
+    return best if codings.get(best, default) > 0 else None
+
+
+class GzipCompressor:
+    """Incremental gzip compressor"""
+
+    def __init__(self, level: int = COMPRESSION_GZIP_LEVEL):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """Compresses data and flushes it so the client can use it"""
+        return (self.compressor.compress(data)
+                + self.compressor.flush(zlib.Z_SYNC_FLUSH))
+
+    def finish(self, data: bytes = b'') -> bytes:
+        """Compresses the last data and closes the stream"""
+        return self.compressor.compress(data) + self.compressor.flush()
+
+
+class BrotliCompressor:
+    """Incremental brotli compressor"""
+
+    def __init__(self, brotli, quality: int = COMPRESSION_BROTLI_QUALITY):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        """Compresses data and flushes it so the client can use it"""
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self, data: bytes = b'') -> bytes:
+        """Compresses the last data and closes the stream"""
+        return self.compressor.process(data) + self.compressor.finish()
+
+
+class CompressionMiddleware:
+    """Compresses text responses above a size, streaming ones by chunk"""
+
+    def __init__(self, app, min_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+        self.brotli = get_brotli()
+
+    def create_compressor(self, encoding: str):
+        """Compressor of a coding"""
+        if encoding == 'br':
+            return BrotliCompressor(self.brotli)
+        return GzipCompressor()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(
+            Headers(scope=scope).get('accept-encoding', ''),
+            self.brotli is not None)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        buffered = b''
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start_message, buffered, compressor
+            if message['type'] == 'http.response.start':
+                headers = Headers(raw=message['headers'])
+                content_type = headers.get('content-type', '')
+                if ('content-encoding' in headers
+                        or not content_type.startswith(COMPRESSIBLE_TYPES)
+                        or content_type.startswith(UNBUFFERED_TYPES)):
+                    start_message = False
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if message['type'] != 'http.response.body' or not start_message:
+                await send(message)
+                return
+
+            more_body = message.get('more_body', False)
+            if compressor is None:
+                # wait until there is enough body to decide
+                buffered += message.get('body', b'')
+                if more_body and len(buffered) < self.min_size:
+                    return
+                if len(buffered) < self.min_size:
+                    await send(start_message)
+                    await send({'type': 'http.response.body',
+                                'body': buffered})
+                    return
+
+                compressor = self.create_compressor(encoding)
+                headers = MutableHeaders(raw=start_message['headers'])
+                del headers['content-length']
+                headers['content-encoding'] = encoding
+                headers.add_vary_header('Accept-Encoding')
+                # the compressed representation has its own validator
+                etag = headers.get('etag')
+                if etag and not etag.startswith('W/'):
+                    headers['etag'] = 'W/' + etag
+                await send(start_message)
+                body, buffered = buffered, b''
+            else:
+                body = message.get('body', b'')
+
+            if more_body:
+                body = compressor.compress(body)
+                if body:
+                    await send({'type': 'http.response.body', 'body': body,
+                                'more_body': True})
+            else:
+                await send({'type': 'http.response.body',
+                            'body': compressor.finish(body)})
+
+        await self.app(scope, receive, send_compressed)
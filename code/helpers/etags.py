@@ -0,0 +1,31 @@
+"""Helper module for conditional requests on the invitation pages"""
+
+from fastapi import Request, Response
+
+
+def get_invitation_etag(invitation: dict) -> str:
+    """Strong ETag of an invitation and everything embedded in it"""
+    return f'"{invitation["_id"]}-{invitation.get("revision", 0)}"'
+
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Checks if If-None-Match has the current ETag"""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    # If-None-Match uses the weak comparison
+    tags = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in tags or etag in tags
+
+
+def set_etag(response: Response, etag: str):
+    """Adds the ETag and asks clients to revalidate before reusing it"""
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+
+
+def not_modified_response(etag: str) -> Response:
+    """Empty 304 response"""
+    response = Response(status_code=304)
+    set_etag(response, etag)
+    return response
@@ -0,0 +1,43 @@
+"""Helper module to stream csv exports"""
+
+import csv
+import io
+from enum import Enum
+
+from fastapi.responses import StreamingResponse
+
+
+EXPORT_FLUSH_ROWS = 500
+
+
+def format_cell(value) -> str:
+    """Formats a document value as a csv cell"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, Enum):
+        return str(value.value)
+    return str(value)
+
+
+def stream_csv(cursor, fields: list[str], filename: str):
+    """Streams the documents of a cursor as csv rows"""
+    async def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+        rows = 0
+        async for document in cursor:
+            writer.writerow([format_cell(document.get(field))
+                             for field in fields])
+            rows += 1
+            if rows % EXPORT_FLUSH_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return StreamingResponse(
+        generate(), media_type='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
@@ -0,0 +1,84 @@
+"""Helper module to read guest import files as a stream"""
+
+import codecs
+import csv
+import json
+from enum import Enum
+
+from fastapi import UploadFile
+
+
+IMPORT_BATCH_SIZE = 500
+IMPORT_CHUNK_SIZE = 64 * 1024
+
+
+class ImportFormatEnum(str, Enum):
+    """Enum with the valid import file formats"""
+    CSV = 'csv'
+    NDJSON = 'ndjson'
+
+
+def get_import_format(upload: UploadFile) -> ImportFormatEnum:
+    """Guesses the file format from its name and content type"""
+    filename = (upload.filename or '').lower()
+    if filename.endswith('.csv') or upload.content_type == 'text/csv':
+        return ImportFormatEnum.CSV
+    return ImportFormatEnum.NDJSON
+
+
+async def read_lines(upload: UploadFile):
+    """Yields the numbered lines of the file reading it in chunks"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    line_number = 0
+    remainder = ''
+    while True:
+        chunk = await upload.read(IMPORT_CHUNK_SIZE)
+        text = remainder + decoder.decode(chunk, final=not chunk)
+        lines = text.split('\n')
+        remainder = lines.pop() if chunk else ''
+        for line in lines:
+            line_number += 1
+            yield line_number, line.rstrip('\r')
+        if not chunk:
+            return
+
+
+async def read_rows(upload: UploadFile, import_format: ImportFormatEnum):
+    """Yields (line number, row, error) for each record of the file
+
+    CSV files need a header line and one record per line.
+    """
+    header = None
+    async for line_number, line in read_lines(upload):
+        if not line.strip():
+            continue
+
+        try:
+            if import_format == ImportFormatEnum.NDJSON:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError('Row is not an object')
+            elif header is None:
+                header = [column.strip() for column in next(csv.reader([line]))]
+                continue
+            else:
+                row = dict(zip(header, next(csv.reader([line]))))
+        except (ValueError, csv.Error) as error:
+            yield line_number, None, str(error)
+            continue
+
+        # empty cells take the default value of the schema
+        yield line_number, {key: value for key, value in row.items()
+                            if value not in ('', None)}, None
+
+
+async def read_batches(upload: UploadFile, import_format: ImportFormatEnum):
+    """Groups the rows of the file in lists of IMPORT_BATCH_SIZE"""
+    batch = []
+    async for row in read_rows(upload, import_format):
+        batch.append(row)
+        if len(batch) == IMPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
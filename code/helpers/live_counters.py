@@ -0,0 +1,168 @@
+"""Helper module to push the guest counter changes to dashboards"""
+
+import asyncio
+import json
+from collections import Counter
+
+from decouple import config
+from fastapi.responses import StreamingResponse
+
+
+SSE_MEDIA_TYPE = 'text/event-stream'
+SSE_HEARTBEAT_SECONDS = config('SSE_HEARTBEAT_SECONDS', default=15.0,
+                               cast=float)
+# Snapshot sent even without resyncs, it corrects a delta published after a
+# snapshot that already counted its write
+SSE_SNAPSHOT_SECONDS = config('SSE_SNAPSHOT_SECONDS', default=300.0,
+                              cast=float)
+# Reads of a snapshot while deltas keep arriving before sending the last one
+SSE_SNAPSHOT_ATTEMPTS = config('SSE_SNAPSHOT_ATTEMPTS', default=5, cast=int)
+# Events a slow client can fall behind before it gets a new snapshot
+SSE_QUEUE_SIZE = config('SSE_QUEUE_SIZE', default=100, cast=int)
+# Sent instead of the events dropped from the queue of a slow client
+RESYNC = None
+
+
+def guest_counters(guest: dict) -> Counter:
+    """Contribution of a guest to the counters of GET /guests/count"""
+    counters = Counter()
+    if guest is None:
+        return counters
+
+    is_kid = bool(guest.get('is_kid', False))
+    is_attending = guest.get('is_attending', False)
+    is_pending = bool(guest.get('is_pending', False))
+    with_plus_one = bool(guest.get('with_plus_one', False))
+    is_plus_one = bool(guest.get('is_plus_one', False))
+
+    counters['total'] = 1 + with_plus_one - is_plus_one
+    counters['is_kid' if is_kid else 'is_adult'] = 1
+    counters['with_plus_one'] = int(with_plus_one)
+    counters['is_plus_one'] = int(is_plus_one)
+    counters['pending'] = int(is_pending)
+    if is_attending and not is_pending:
+        counters['attending'] = 1
+        counters['kid_attending' if is_kid else 'adult_attending'] = 1
+    if not is_attending and not is_pending and is_attending is not None:
+        counters['not_attending'] = 1
+        counters['kid_not_attending' if is_kid else 'adult_not_attending'] = 1
+    return counters
+
+
+def get_counters_delta(changes) -> dict:
+    """Counter changes of a list of (before, after) guest documents"""
+    delta = Counter()
+    for before, after in changes:
+        delta.update(guest_counters(after))
+        delta.subtract(guest_counters(before))
+    return {counter: value for counter, value in delta.items() if value}
+
+
+class Broadcaster:
+    """Fans out the events of a topic to a queue per subscriber"""
+
+    def __init__(self, queue_size: int = SSE_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscribers = {}
+
+    def subscribe(self, topic: str) -> asyncio.Queue:
+        """Queue receiving every event of topic published from now on"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.setdefault(topic, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, topic: str, queue: asyncio.Queue):
+        """Stops sending events to queue"""
+        queues = self.subscribers.get(topic, set())
+        queues.discard(queue)
+        if not queues:
+            self.subscribers.pop(topic, None)
+
+    def publish(self, topic: str, event):
+        """Sends event to the subscribers of topic without waiting"""
+        for queue in self.subscribers.get(topic, ()):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # the client is too slow, it gets a new snapshot instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+
+GUEST_COUNTER_EVENTS = Broadcaster()
+
+
+def get_guest_counter_events() -> Broadcaster:
+    """Returns the broadcaster of the guest counter changes"""
+    return GUEST_COUNTER_EVENTS
+
+
+def publish_guest_changes(broadcaster: Broadcaster, wedding_id: str,
+                          *changes):
+    """Publishes the counters delta of (before, after) guest documents"""
+    if wedding_id in broadcaster.subscribers:
+        delta = get_counters_delta(changes)
+        if delta:
+            broadcaster.publish(wedding_id, delta)
+
+
+def format_event(event: str, data: dict) -> str:
+    """Server-sent event message"""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def load_settled_snapshot(queue: asyncio.Queue, load_snapshot):
+    """Reads a snapshot again while deltas arrive during the read
+
+    Returns the snapshot and whether no delta arrived during its read.
+    """
+    for _ in range(SSE_SNAPSHOT_ATTEMPTS):
+        # deltas queued before the read are already in the snapshot
+        while not queue.empty():
+            queue.get_nowait()
+        snapshot = await load_snapshot()
+        # a delta published meanwhile may or may not be in the snapshot
+        if queue.empty():
+            return snapshot, True
+    return snapshot, False
+
+
+def stream_counters(broadcaster: Broadcaster, topic: str, load_snapshot):
+    """Streams a counters snapshot followed by the deltas of topic as SSE"""
+    async def events():
+        # subscribe first so no delta is lost while reading the snapshot
+        queue = broadcaster.subscribe(topic)
+        loop = asyncio.get_running_loop()
+        try:
+            snapshot_due = True
+            while True:
+                if snapshot_due:
+                    snapshot, settled = await load_settled_snapshot(
+                        queue, load_snapshot)
+                    yield format_event('snapshot', snapshot)
+                    # too many writes to settle, try again soon
+                    next_snapshot = loop.time() + (
+                        SSE_SNAPSHOT_SECONDS if settled
+                        else SSE_HEARTBEAT_SECONDS)
+                    snapshot_due = False
+                try:
+                    delta = await asyncio.wait_for(
+                        queue.get(), min(SSE_HEARTBEAT_SECONDS,
+                                         next_snapshot - loop.time()))
+                except asyncio.TimeoutError:
+                    snapshot_due = loop.time() >= next_snapshot
+                    if not snapshot_due:
+                        # keeps proxies from closing an idle connection
+                        yield ': heartbeat\n\n'
+                    continue
+                if delta is RESYNC:
+                    snapshot_due = True
+                else:
+                    yield format_event('delta', delta)
+        finally:
+            broadcaster.unsubscribe(topic, queue)
+
+    return StreamingResponse(events(), media_type=SSE_MEDIA_TYPE,
+                             headers={'Cache-Control': 'no-cache',
+                                      'X-Accel-Buffering': 'no'})
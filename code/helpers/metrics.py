@@ -0,0 +1,190 @@
+"""Helper module with prometheus metrics and request instrumentation"""
+
+import threading
+import time
+from collections import Counter as CollectionCounter
+from contextvars import ContextVar
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250)
+# Route label of the requests no route matched, a label per raw path would
+# add a series for every URL a scanner tries
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+def format_labels(label_names, label_values, extra='') -> str:
+    """Prometheus label set"""
+    labels = [f'{name}="{escape_label(value)}"'
+              for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def escape_label(value) -> str:
+    """Escapes a label value"""
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+class Counter:
+    """Monotonic counter by label values"""
+
+    def __init__(self, name: str, documentation: str,
+                 label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.values = CollectionCounter()
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        """Adds amount to the counter of the label values"""
+        with self._lock:
+            self.values[label_values] += amount
+
+    def render(self) -> list[str]:
+        """Prometheus text format lines"""
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self.values.items()):
+                labels = format_labels(self.label_names, label_values)
+                lines.append(f'{self.name}{labels} {value}')
+        return lines
+
+
+class Histogram:
+    """Cumulative histogram by label values"""
+
+    def __init__(self, name: str, documentation: str,
+                 label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = buckets
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        """Adds a sample to the histogram of the label values"""
+        with self._lock:
+            # bucket counts, sum and count of the samples
+            sample = self.values.setdefault(
+                label_values, [[0] * len(self.buckets), 0.0, 0])
+            for index, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    sample[0][index] += 1
+            sample[1] += value
+            sample[2] += 1
+
+    def render(self) -> list[str]:
+        """Prometheus text format lines"""
+        lines = [f'# HELP {self.name} {self.documentation}',
+                 f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_values, (counts, total, samples) in sorted(
+                    self.values.items()):
+                for bucket, count in zip(self.buckets, counts):
+                    labels = format_labels(self.label_names, label_values,
+                                           f'le="{bucket}"')
+                    lines.append(f'{self.name}_bucket{labels} {count}')
+                labels = format_labels(self.label_names, label_values,
+                                       'le="+Inf"')
+                lines.append(f'{self.name}_bucket{labels} {samples}')
+                labels = format_labels(self.label_names, label_values)
+                lines.append(f'{self.name}_sum{labels} {total}')
+                lines.append(f'{self.name}_count{labels} {samples}')
+        return lines
+
+
+def render_gauge(name: str, documentation: str, value) -> list[str]:
+    """Prometheus text format lines of a single gauge value"""
+    return [f'# HELP {name} {documentation}',
+            f'# TYPE {name} gauge',
+            f'{name} {value}']
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency',
+    ('method', 'route', 'status'))
+DB_COMMANDS = Counter(
+    'mongodb_commands_total', 'MongoDB commands sent',
+    ('route', 'command', 'collection', 'outcome'))
+DB_COMMAND_SECONDS = Histogram(
+    'mongodb_command_duration_seconds', 'MongoDB command latency',
+    ('route', 'command'))
+DB_COMMANDS_PER_REQUEST = Histogram(
+    'mongodb_commands_per_request', 'MongoDB commands sent by one request',
+    ('route',), COUNT_BUCKETS)
+SINGLE_FLIGHT_FETCHES = Counter(
+    'single_flight_fetches_total',
+    'Reads executed or coalesced with an identical read in flight',
+    ('fetch', 'outcome'))
+METRICS = [HTTP_REQUEST_SECONDS, DB_COMMANDS, DB_COMMAND_SECONDS,
+           DB_COMMANDS_PER_REQUEST, SINGLE_FLIGHT_FETCHES]
+
+
+def render_metrics() -> list[str]:
+    """Prometheus text format lines of every registered metric"""
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    return lines
+
+
+class RequestStats:
+    """Database commands sent while handling one request"""
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.commands = CollectionCounter()
+
+    @property
+    def route(self) -> str:
+        """Path template of the matched route, or UNMATCHED_ROUTE"""
+        route = self.scope.get('route')
+        return getattr(route, 'path', None) or UNMATCHED_ROUTE
+
+    @property
+    def total(self) -> int:
+        """Commands sent by the request"""
+        return sum(self.commands.values())
+
+
+REQUEST_STATS: ContextVar[RequestStats] = ContextVar('request_stats',
+                                                     default=None)
+
+
+class MetricsMiddleware:
+    """Records the latency and database commands of each request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = REQUEST_STATS.set(stats)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_STATS.reset(token)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                         scope['method'], stats.route,
+                                         status)
+            DB_COMMANDS_PER_REQUEST.observe(stats.total, stats.route)
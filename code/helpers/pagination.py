@@ -0,0 +1,90 @@
+"""Helper module to paginate and stream list endpoints"""
+
+import base64
+import binascii
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 100
+
+
+def encode_cursor(object_id: ObjectId) -> str:
+    """Creates the opaque token of the page after object_id"""
+    return base64.urlsafe_b64encode(object_id.binary).decode()
+
+
+def decode_cursor(token: str) -> ObjectId:
+    """Returns the object id stored in a page token"""
+    try:
+        return ObjectId(base64.urlsafe_b64decode(token.encode()))
+    except (binascii.Error, InvalidId, ValueError) as error:
+        raise HTTPException(status_code=400,
+                            detail='Invalid cursor') from error
+
+
+def find_cursor(collection, query, limit=None, after=None):
+    """Creates a cursor over query ordered by _id when paginating"""
+    if after is not None:
+        query = query | {'_id': {'$gt': decode_cursor(after)}}
+    cursor = collection.find(query)
+    if limit is not None or after is not None:
+        cursor = cursor.sort('_id', 1)
+    if limit is not None:
+        cursor = cursor.limit(limit)
+    return cursor
+
+
+async def find_page(collection, query, limit=None, after=None):
+    """Returns the documents of a page and the token of the next one"""
+    cursor = find_cursor(collection, query,
+                         limit + 1 if limit is not None else None, after)
+    documents = await cursor.to_list(length=None)
+    if limit is not None and len(documents) > limit:
+        documents = documents[:limit]
+        return documents, encode_cursor(documents[-1]['_id'])
+    return documents, None
+
+
+def next_cursor_headers(next_cursor) -> dict:
+    """Headers with the token of the next page"""
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+
+
+def set_next_cursor(response: Response, next_cursor):
+    """Adds the token of the next page to the response headers"""
+    response.headers.update(next_cursor_headers(next_cursor))
+
+
+def wants_ndjson(request: Request) -> bool:
+    """Checks if the client asked for a newline delimited json stream"""
+    return NDJSON_MEDIA_TYPE in request.headers.get('accept', '')
+
+
+def stream_ndjson(cursor, model, prepare=None):
+    """Streams the documents of a cursor one json line at a time"""
+    async def generate():
+        batch = []
+        async for document in cursor:
+            batch.append(document)
+            if len(batch) == STREAM_BATCH_SIZE:
+                for line in await render_batch(batch):
+                    yield line
+                batch = []
+        for line in await render_batch(batch):
+            yield line
+
+    async def render_batch(documents):
+        if prepare is not None and documents:
+            await prepare(documents)
+        return [model.parse_obj(document).json(
+            by_alias=True, ensure_ascii=False, separators=(',', ':')) + '\n'
+            for document in documents]
+
+    return StreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
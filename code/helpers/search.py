@@ -0,0 +1,45 @@
+"""Helper module to build normalized search keys"""
+
+import re
+import unicodedata
+
+
+# Separates the title and the artist, in either order, "ABBA - Mamma Mia"
+SONG_PART_SEPARATOR = re.compile(r'\s+[-–—|]\s+')
+# Apostrophes join the word, "Don't" is the same song as "Dont"
+SONG_APOSTROPHES = re.compile(r"['’]")
+SONG_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase text without accents and repeated spaces"""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    stripped = ''.join(character for character in decomposed
+                       if not unicodedata.combining(character))
+    return ' '.join(stripped.casefold().split())
+
+
+def get_search_key(name: str, last_name: str) -> str:
+    """Search key of a guest, "José  Pérez" becomes "jose perez\""""
+    return normalize_text(f'{name} {last_name}')
+
+
+def normalize_song_part(part: str) -> str:
+    """Title or artist without case, accents and punctuation"""
+    return normalize_text(SONG_PUNCTUATION.sub(
+        ' ', SONG_APOSTROPHES.sub('', part)))
+
+
+def get_song_key(name: str) -> str:
+    """Key of a song, "ABBA - Dancing Queen" becomes "abba - dancing queen\""""
+    # which part is the title is unknown, sorted they match in either order
+    parts = sorted(filter(None, map(normalize_song_part,
+                                    SONG_PART_SEPARATOR.split(name or ''))))
+    # names made only of punctuation keep it rather than an empty key
+    return ' - '.join(parts) or normalize_text(name)
+
+
+def get_prefix_query(field: str, prefix: str) -> dict:
+    """Index range matching the values of field starting with prefix"""
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return {field: {'$gte': prefix, '$lt': upper_bound}}
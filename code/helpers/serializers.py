@@ -0,0 +1,55 @@
+"""Helper module to serialize mongo documents straight to json"""
+
+from datetime import date, datetime, time
+
+import orjson
+from bson import ObjectId
+from decouple import config
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic.fields import SHAPE_LIST
+
+
+FAST_JSON_RESPONSES = config('FAST_JSON_RESPONSES', default=False,
+                             cast=bool)
+
+
+def encode_value(value):
+    """Encodes the types orjson does not handle like jsonable_encoder"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    raise TypeError(f'Type is not JSON serializable: {type(value).__name__}')
+
+
+class MongoJSONResponse(JSONResponse):
+    """JSON response rendered with orjson"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=encode_value,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+def serialize_document(document: dict, model: type[BaseModel]) -> dict:
+    """Keeps the fields of model in its order, like the response_model"""
+    serialized = {}
+    for field in model.__fields__.values():
+        if field.alias in document:
+            value = document[field.alias]
+        else:
+            value = field.get_default()
+
+        if (value is not None and isinstance(field.type_, type)
+                and issubclass(field.type_, BaseModel)):
+            if field.shape == SHAPE_LIST:
+                value = serialize_documents(value, field.type_)
+            else:
+                value = serialize_document(value, field.type_)
+        serialized[field.alias] = value
+    return serialized
+
+
+def serialize_documents(documents, model: type[BaseModel]) -> list[dict]:
+    """Serializes a list of documents without validating them"""
+    return [serialize_document(document, model) for document in documents]
@@ -0,0 +1,53 @@
+"""Helper module to share one in flight read between identical requests"""
+
+import asyncio
+import copy
+
+from decouple import config
+
+from .metrics import SINGLE_FLIGHT_FETCHES
+
+
+SINGLE_FLIGHT_ENABLED = config('SINGLE_FLIGHT_ENABLED', default=True,
+                               cast=bool)
+
+
+class SingleFlight:
+    """Runs one fetch per key at a time, concurrent callers wait for it"""
+
+    def __init__(self, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.enabled = enabled
+        self.calls = {}
+
+    async def do(self, key: tuple, fetch):
+        """Result of fetch(), shared with the callers of the same key
+
+        The first element of key names the fetch in the metrics. Every
+        caller gets its own copy of the result to modify.
+        """
+        if not self.enabled:
+            return await fetch()
+
+        task = self.calls.get(key)
+        if task is None:
+            # a task so a cancelled caller does not cancel the others
+            task = asyncio.ensure_future(fetch())
+            self.calls[key] = task
+            task.add_done_callback(lambda _: self.forget(key, task))
+            SINGLE_FLIGHT_FETCHES.inc(key[0], 'executed')
+        else:
+            SINGLE_FLIGHT_FETCHES.inc(key[0], 'coalesced')
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def forget(self, key: tuple, task: asyncio.Future):
+        """Removes a finished fetch so the next call runs a new one"""
+        if self.calls.get(key) is task:
+            del self.calls[key]
+
+
+SINGLE_FLIGHT = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    """Returns the single flight of the database reads"""
+    return SINGLE_FLIGHT
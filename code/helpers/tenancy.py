@@ -0,0 +1,20 @@
+"""Helper module to scope every request to a wedding"""
+
+import re
+
+from decouple import config
+from fastapi import Header, HTTPException
+
+
+# Wedding of the requests without the X-Wedding-Id header and of the data
+# stored before the service had several weddings
+DEFAULT_WEDDING_ID = config('DEFAULT_WEDDING_ID', default='default')
+WEDDING_ID_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]{0,63}$')
+
+
+def get_wedding_id(x_wedding_id: str = Header(None)) -> str:
+    """Wedding of the request taken from the X-Wedding-Id header"""
+    wedding_id = x_wedding_id or DEFAULT_WEDDING_ID
+    if not WEDDING_ID_PATTERN.match(wedding_id):
+        raise HTTPException(status_code=400, detail='Invalid wedding id')
+    return wedding_id
@@ -1,14 +1,25 @@
 """Main entrypoint for the FastAPI application."""
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.middleware.cors import CORSMiddleware
 
 from pydantic.error_wrappers import ValidationError
 from bson.errors import InvalidId
 
 from .routes import invitations, health, guests, songs
-from .database.mongodb import configure_database, get_database
+from .database.counters import start_seen_buffer, stop_seen_buffer
+from .database.denormalized import (
+    start_embedded_guests_watcher,
+    stop_embedded_guests_watcher
+)
+from .database.mongodb import (
+    close_database,
+    connect_database,
+    warm_up_database
+)
+from .helpers.compression import COMPRESSION_ENABLED, CompressionMiddleware
+from .helpers.metrics import MetricsMiddleware
 
 from .errors import validation_exception_handler
 from .errors import validation_exception_bson_handler
@@ -18,8 +29,29 @@ from .errors import validation_exception_bson_handler
 #     return {"token": token}
 
 
-app = FastAPI(title='Invitations Service', version='0.0.1')
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    """Connect and warm up the database before serving requests"""
+    database = connect_database()
+    if database is not None:
+        await warm_up_database(database)
+    start_seen_buffer(database)
+    start_embedded_guests_watcher(database)
+    yield
+    await stop_embedded_guests_watcher()
+    # write the buffered counters before closing the client
+    await stop_seen_buffer()
+    close_database()
 
+
+app = FastAPI(title='Invitations Service', version='0.0.1', lifespan=lifespan)
+
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+# added last to be the outermost and time the compression too
+app.add_middleware(MetricsMiddleware)
+
+# from fastapi.middleware.cors import CORSMiddleware
 # app.add_middleware(
 #     CORSMiddleware,
 #     allow_origins=["*"],  # origins
@@ -41,11 +73,6 @@ app.add_exception_handler(ValidationError, validation_exception_handler)
 app.add_exception_handler(InvalidId, validation_exception_bson_handler)
 
 
-DB = get_database()
-
-configure_database(DB)
-
-
 @app.post("/token")
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login endpoint for the FastAPI application."""
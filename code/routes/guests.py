@@ -2,10 +2,51 @@
 from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime
 from bson import ObjectId
+from pydantic import ValidationError
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
 
-from fastapi import APIRouter, Depends
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile
+)
+from ..database.cache import get_cache, get_report_scope
+from ..database.denormalized import refresh_embedded_guests
 from ..database.mongodb import get_database
+from ..database.revisions import touch_invitations
+from ..helpers.exports import stream_csv
 from ..helpers.http_error import HTTPError
+from ..helpers.imports import (
+    ImportFormatEnum,
+    get_import_format,
+    read_batches
+)
+from ..helpers.live_counters import (
+    get_guest_counter_events,
+    publish_guest_changes,
+    stream_counters
+)
+from ..helpers.pagination import (
+    MAX_PAGE_SIZE,
+    find_cursor,
+    find_page,
+    next_cursor_headers,
+    set_next_cursor,
+    stream_ndjson,
+    wants_ndjson
+)
+from ..helpers.search import get_prefix_query, get_search_key, normalize_text
+from ..helpers.serializers import (
+    FAST_JSON_RESPONSES,
+    MongoJSONResponse,
+    serialize_documents
+)
+from ..helpers.tenancy import get_wedding_id
 from ..schemas.invitations import (
     FoodOptionsEnum,
     Guest,
@@ -20,79 +61,346 @@ router = APIRouter(prefix='/guests',
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
+def format_validation_error(error: ValidationError) -> str:
+    """Single line description of a validation error"""
+    return '; '.join(f"{'.'.join(map(str, detail['loc']))}: {detail['msg']}"
+                     for detail in error.errors())
+
+
+async def import_guest_batch(batch, wedding_id, database, cache, events):
+    """Validates and inserts a batch of imported rows into a wedding"""
+    errors = [{'row': line, 'detail': error}
+              for line, _, error in batch if error]
+    rows = [(line, row) for line, row, error in batch if not error]
+
+    # resolve every invitation of the batch with a single query
+    invitation_ids = [ObjectId(row['invitation_id']) for _, row in rows
+                      if ObjectId.is_valid(row.get('invitation_id'))]
+    invitation_names = [row['invitation_name'] for _, row in rows
+                        if 'invitation_name' in row]
+    invitations = await database.invitations.find(
+        {'wedding_id': wedding_id,
+         '$or': [{'_id': {'$in': invitation_ids}},
+                 {'name': {'$in': invitation_names}}]},
+        {'name': 1}).to_list(length=None)
+    ids = {str(invitation['_id']): invitation['_id']
+           for invitation in invitations}
+    names = {invitation['name']: invitation['_id']
+             for invitation in invitations}
+
+    documents = []
+    document_lines = []
+    created_at = datetime.now()
+    for line, row in rows:
+        invitation_id = (ids.get(str(row.get('invitation_id')))
+                         or names.get(row.get('invitation_name')))
+        if invitation_id is None:
+            errors.append({'row': line, 'detail': 'Invitation not found'})
+            continue
+        try:
+            guest = Guest(**row | {'wedding_id': wedding_id,
+                                   'invitation_id': invitation_id})
+        except ValidationError as error:
+            errors.append({'row': line,
+                           'detail': format_validation_error(error)})
+            continue
+        documents.append(
+            GuestInDB(**guest.dict(), created_at=created_at).dict()
+            | {'search_key': get_search_key(guest.name, guest.last_name)})
+        document_lines.append(line)
+
+    inserted = 0
+    if documents:
+        failed = set()
+        try:
+            result = await database.guests.insert_many(documents,
+                                                       ordered=False)
+            inserted = len(result.inserted_ids)
+        except BulkWriteError as error:
+            inserted = error.details['nInserted']
+            for write_error in error.details['writeErrors']:
+                failed.add(write_error['index'])
+                errors.append({'row': document_lines[write_error['index']],
+                               'detail': write_error['errmsg']})
+        publish_guest_changes(events, wedding_id, *[
+            (None, document) for index, document in enumerate(documents)
+            if index not in failed])
+        invitation_ids = {document['invitation_id']
+                          for document in documents}
+        await touch_invitations(database, wedding_id, *invitation_ids)
+        await refresh_embedded_guests(database, wedding_id, *invitation_ids)
+        await cache.invalidate(get_report_scope(wedding_id), *invitation_ids)
+    return inserted, errors
+
+
 @router.get('/', response_model=list[GuestGet])
-async def get_guests(database=Depends(get_database)):
+async def get_guests(request: Request,
+                     response: Response,
+                     limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                     after: str = None,
+                     wedding_id: str = Depends(get_wedding_id),
+                     database=Depends(get_database)):
     """Get all guests"""
-    guests = list(database.guests.find({}))
+    query = {'wedding_id': wedding_id}
+    if wants_ndjson(request):
+        return stream_ndjson(
+            find_cursor(database.guests, query, limit, after), GuestGet)
+
+    guests, next_cursor = await find_page(database.guests, query, limit,
+                                          after)
+    if FAST_JSON_RESPONSES:
+        return MongoJSONResponse(serialize_documents(guests, GuestGet),
+                                 headers=next_cursor_headers(next_cursor))
+
+    set_next_cursor(response, next_cursor)
     return guests
 
 
+# A missing field is falsy and, unlike null, is not equal to None inside
+# aggregation expressions, matching the previous guest.get() checks
+ATTENDING = {'$and': ['$is_attending', {'$not': '$is_pending'}]}
+NOT_ATTENDING = {'$and': [{'$not': '$is_attending'},
+                          {'$not': '$is_pending'},
+                          {'$ne': ['$is_attending', None]}]}
+
+# Counters of GET /guests/count computed server side, they follow the
+# $match of the wedding
+COUNT_PIPELINE = [
+    {'$group': {
+        '_id': None,
+        'count': {'$sum': 1},
+        'is_adult': {'$sum': {'$cond': ['$is_kid', 0, 1]}},
+        'is_kid': {'$sum': {'$cond': ['$is_kid', 1, 0]}},
+        'with_plus_one': {'$sum': {'$cond': ['$with_plus_one', 1, 0]}},
+        'is_plus_one': {'$sum': {'$cond': ['$is_plus_one', 1, 0]}},
+        'pending': {'$sum': {'$cond': ['$is_pending', 1, 0]}},
+        'attending': {'$sum': {'$cond': [ATTENDING, 1, 0]}},
+        'not_attending': {'$sum': {'$cond': [NOT_ATTENDING, 1, 0]}},
+        'adult_attending': {'$sum': {'$cond': [
+            {'$and': [ATTENDING, {'$not': '$is_kid'}]}, 1, 0]}},
+        'kid_attending': {'$sum': {'$cond': [
+            {'$and': [ATTENDING, '$is_kid']}, 1, 0]}},
+        'adult_not_attending': {'$sum': {'$cond': [
+            {'$and': [NOT_ATTENDING, {'$not': '$is_kid'}]}, 1, 0]}},
+        'kid_not_attending': {'$sum': {'$cond': [
+            {'$and': [NOT_ATTENDING, '$is_kid']}, 1, 0]}},
+    }},
+]
+
+COUNTERS = ['is_adult', 'is_kid', 'with_plus_one', 'is_plus_one', 'pending',
+            'attending', 'not_attending', 'adult_attending', 'kid_attending',
+            'adult_not_attending', 'kid_not_attending']
+
+
+def match_wedding(wedding_id: str, pipeline: list) -> list:
+    """Pipeline restricted to the documents of a wedding"""
+    return [{'$match': {'wedding_id': wedding_id}}] + pipeline
+
+
+async def load_guest_counters(database, wedding_id: str) -> dict:
+    """Counters of every guest of a wedding computed by the database"""
+    result = await database.guests.aggregate(
+        match_wedding(wedding_id, COUNT_PIPELINE)).to_list(length=None)
+    counters = result[0] if result else {}
+    total = (counters.get('count', 0) + counters.get('with_plus_one', 0)
+             - counters.get('is_plus_one', 0))
+    return {'total': total} | {
+        counter: counters.get(counter, 0) for counter in COUNTERS}
+
+
 @router.get('/count')
-async def count_guests(database=Depends(get_database)):
+async def count_guests(wedding_id: str = Depends(get_wedding_id),
+                       database=Depends(get_database)):
     """Count all guests"""
-    all_guests = list(database.guests.find({}))
-    is_adult = 0
-    is_kid = 0
-    attending = 0
-    adult_attending = 0
-    kid_attending = 0
-    not_attending = 0
-    adult_not_attending = 0
-    kid_not_attending = 0
-    pending = 0
-    with_plus_one = 0
-    is_plus_one = 0
-    for guest in all_guests:
-        print(guest)
-        if guest.get('is_kid', False):
-            is_kid += 1
-        else:
-            is_adult += 1
-        if guest.get('is_attending', False) and not guest.get('is_pending', False):
-            attending += 1
-            if guest.get('is_kid', False):
-                kid_attending += 1
-            else:
-                adult_attending += 1
-        if not guest.get('is_attending', False) and not guest.get('is_pending', False) and guest.get('is_attending', False) is not None:
-            not_attending += 1
-            if guest.get('is_kid', False):
-                kid_not_attending += 1
-            else:
-                adult_not_attending += 1
-        if guest.get('is_pending', False):
-            pending += 1
-        if guest.get('with_plus_one', False):
-            with_plus_one += 1
-        if guest.get('is_plus_one', False):
-            is_plus_one += 1
-
-    total = len(all_guests) + with_plus_one - is_plus_one
-    return {
-        'total': total,
-        'is_adult': is_adult,
-        'is_kid': is_kid,
-        'with_plus_one': with_plus_one,
-        'is_plus_one': is_plus_one,
-        'pending': pending,
-        'attending': attending,
-        'not_attending': not_attending,
-        'adult_attending': adult_attending,
-        'kid_attending': kid_attending,
-        'adult_not_attending': adult_not_attending,
-        'kid_not_attending': kid_not_attending
-    }
+    return await load_guest_counters(database, wedding_id)
+
+
+@router.get('/count/stream')
+async def stream_guest_counters(wedding_id: str = Depends(get_wedding_id),
+                                database=Depends(get_database),
+                                events=Depends(get_guest_counter_events)):
+    """Server-sent events with the counters followed by their changes
+
+    The first event is a snapshot like GET /guests/count, the next ones
+    are deltas with only the counters that changed.
+    """
+    return stream_counters(
+        events, wedding_id, lambda: load_guest_counters(database, wedding_id))
+
+
+CATERING_STATUSES = {
+    'attending': ATTENDING,
+    'pending': '$is_pending',
+    'not_attending': NOT_ATTENDING,
+}
+
+# Menu counts by age and status plus the plus-ones of each invitation,
+# they follow the $match of the wedding
+REPORT_PIPELINE = [
+    {'$facet': {
+        'menus': [
+            {'$group': {
+                '_id': {'menu': '$menu',
+                        'is_kid': {'$cond': ['$is_kid', True, False]}},
+            } | {status: {'$sum': {'$cond': [condition, 1, 0]}}
+                 for status, condition in CATERING_STATUSES.items()}},
+        ],
+        'plus_ones': [
+            {'$group': {
+                '_id': '$invitation_id',
+                'with_plus_one': {'$sum': {'$cond': ['$with_plus_one', 1, 0]}},
+                'is_plus_one': {'$sum': {'$cond': ['$is_plus_one', 1, 0]}},
+            }},
+            {'$match': {'$or': [{'with_plus_one': {'$gt': 0}},
+                                {'is_plus_one': {'$gt': 0}}]}},
+            {'$lookup': {
+                'from': 'invitations',
+                'localField': '_id',
+                'foreignField': '_id',
+                'as': 'invitation'
+            }},
+            {'$project': {
+                '_id': 0,
+                'invitation_id': '$_id',
+                'invitation_name': {'$arrayElemAt': ['$invitation.name', 0]},
+                'with_plus_one': 1,
+                'is_plus_one': 1,
+            }},
+            {'$sort': {'invitation_name': 1}},
+        ],
+    }},
+]
+
+
+def empty_menu_counts() -> dict:
+    """Zero counts of a menu by age and status"""
+    return {age: dict.fromkeys(CATERING_STATUSES, 0)
+            for age in ('adult', 'kid')}
+
+
+def get_menu_name(menu) -> str:
+    """Report name of a menu, guests confirmed without one go apart"""
+    return getattr(menu, 'value', menu) or 'not selected'
+
+
+@router.get('/report')
+async def catering_report(wedding_id: str = Depends(get_wedding_id),
+                          database=Depends(get_database),
+                          token: str = Depends(oauth2_scheme),
+                          cache=Depends(get_cache)):
+    """Menu counts by age and attendance and plus-ones per invitation"""
+    report_scope = get_report_scope(wedding_id)
+    report = await cache.get(report_scope, 'catering')
+    if report is not None:
+        return report
+
+    result = await database.guests.aggregate(
+        match_wedding(wedding_id, REPORT_PIPELINE)).to_list(length=None)
+    menus = {menu.value: empty_menu_counts() for menu in FoodOptionsEnum}
+    for group in result[0]['menus']:
+        menu = get_menu_name(group['_id'].get('menu'))
+        age = 'kid' if group['_id']['is_kid'] else 'adult'
+        counts = menus.setdefault(menu, empty_menu_counts())[age]
+        for status in CATERING_STATUSES:
+            counts[status] += group[status]
+
+    report = {'menus': menus,
+              'plus_ones': [
+                  plus_one | {'invitation_id': str(plus_one['invitation_id'])}
+                  for plus_one in result[0]['plus_ones']]}
+    await cache.set(report_scope, 'catering', report)
+    return report
+
+
+@router.get('/search')
+async def search_guests(q: str,
+                        limit: int = Query(10, ge=1, le=50),
+                        wedding_id: str = Depends(get_wedding_id),
+                        database=Depends(get_database)):
+    """Guests whose name starts with q ignoring case and accents"""
+    prefix = normalize_text(q)
+    if not prefix:
+        return []
+    guests = await database.guests.find(
+        {'wedding_id': wedding_id} | get_prefix_query('search_key', prefix),
+        {'name': 1, 'last_name': 1, 'invitation_id': 1}
+    ).sort('search_key', 1).limit(limit).to_list(length=None)
+    return guests
+
+
+EXPORT_FIELDS = ['invitation_name', 'name', 'last_name', 'is_attending',
+                 'is_pending', 'is_kid', 'menu', 'with_plus_one',
+                 'is_plus_one', 'invitation_id', '_id']
+
+
+@router.get('/export')
+async def export_guests(is_attending: bool = None,
+                        menu: FoodOptionsEnum = None,
+                        is_kid: bool = None,
+                        wedding_id: str = Depends(get_wedding_id),
+                        database=Depends(get_database),
+                        token: str = Depends(oauth2_scheme)):
+    """Export the guests with their invitation name as csv"""
+    query = {'wedding_id': wedding_id}
+    if is_attending is not None:
+        query['is_attending'] = is_attending
+    if menu is not None:
+        query['menu'] = menu.value
+    if is_kid is not None:
+        query['is_kid'] = is_kid
+
+    cursor = database.guests.aggregate([
+        {'$match': query},
+        {'$lookup': {
+            'from': 'invitations',
+            'localField': 'invitation_id',
+            'foreignField': '_id',
+            'as': 'invitation'
+        }},
+        {'$project': {field: 1 for field in EXPORT_FIELDS}
+         | {'invitation_name': {'$arrayElemAt': ['$invitation.name', 0]}}},
+    ])
+    return stream_csv(cursor, EXPORT_FIELDS, 'guests.csv')
 
 
 @router.get('/{guest_id}', response_model=GuestGet)
-async def get_guest(guest_id: str, database=Depends(get_database)):
+async def get_guest(guest_id: str,
+                    wedding_id: str = Depends(get_wedding_id),
+                    database=Depends(get_database)):
     """Get a guest"""
-    guest = database.guests.find_one({'_id': ObjectId(guest_id)})
+    guest = await database.guests.find_one({'wedding_id': wedding_id,
+                                            '_id': ObjectId(guest_id)})
     if guest:
         return guest
     raise HTTPError(status_code=404, detail='Guest not found')
 
 
+@router.post('/import')
+async def import_guests(file: UploadFile,
+                        file_format: ImportFormatEnum = None,
+                        wedding_id: str = Depends(get_wedding_id),
+                        database=Depends(get_database),
+                        token: str = Depends(oauth2_scheme),
+                        cache=Depends(get_cache),
+                        events=Depends(get_guest_counter_events)):
+    """Create guests from a CSV or NDJSON file
+
+    Rows reference their invitation by invitation_id or invitation_name.
+    Invalid rows are reported and skipped without aborting the import.
+    """
+    file_format = file_format or get_import_format(file)
+    inserted = 0
+    errors = []
+    async for batch in read_batches(file, file_format):
+        batch_inserted, batch_errors = await import_guest_batch(
+            batch, wedding_id, database, cache, events)
+        inserted += batch_inserted
+        errors += batch_errors
+
+    return {'inserted': inserted,
+            'errors': sorted(errors, key=lambda error: error['row'])}
+
+
 @router.post('/')
 async def create_guest(name: str,
                        last_name: str,
@@ -103,16 +411,20 @@ async def create_guest(name: str,
                        menu: FoodOptionsEnum = FoodOptionsEnum.NO_RESTRICTION,
                        with_plus_one: bool = False,
                        is_plus_one: bool = False,
-                       database=Depends(get_database), token: str = Depends(oauth2_scheme)):
+                       wedding_id: str = Depends(get_wedding_id),
+                       database=Depends(get_database), token: str = Depends(oauth2_scheme),
+                       cache=Depends(get_cache),
+                       events=Depends(get_guest_counter_events)):
     """Create a guest"""
     # check that invitation exists
     if invitation_id:
-        invitation = database.invitations.find_one(
-            {'_id': ObjectId(invitation_id)})
+        invitation = await database.invitations.find_one(
+            {'wedding_id': wedding_id, '_id': ObjectId(invitation_id)})
         if not invitation:
             raise HTTPError(status_code=400, detail='Invitation not found')
 
-    guest = Guest(name=name,
+    guest = Guest(wedding_id=wedding_id,
+                  name=name,
                   last_name=last_name,
                   is_confirmed=is_confirmed,
                   is_pending=is_pending,
@@ -122,8 +434,16 @@ async def create_guest(name: str,
                   invitation_id=invitation_id,
                   is_plus_one=is_plus_one)
     guest_in_db = GuestInDB(**guest.dict(), created_at=datetime.now())
-    created_id = database.guests.insert_one(guest_in_db.dict()).inserted_id
-    guest = database.guests.find_one({'_id': created_id})
+    result = await database.guests.insert_one(
+        guest_in_db.dict() | {'search_key': get_search_key(name, last_name)})
+    await touch_invitations(database, wedding_id, guest_in_db.invitation_id)
+    await refresh_embedded_guests(database, wedding_id,
+                                  guest_in_db.invitation_id)
+    await cache.invalidate(guest_in_db.invitation_id,
+                           get_report_scope(wedding_id))
+    guest = await database.guests.find_one({'wedding_id': wedding_id,
+                                            '_id': result.inserted_id})
+    publish_guest_changes(events, wedding_id, (None, guest))
     return guest
 
 
@@ -138,8 +458,11 @@ async def update_guest(guest_id: str,
                        menu: FoodOptionsEnum = None,
                        with_plus_one: bool = None,
                        is_plus_one: bool = None,
+                       wedding_id: str = Depends(get_wedding_id),
                        database=Depends(get_database),
-                       token: str = Depends(oauth2_scheme)):
+                       token: str = Depends(oauth2_scheme),
+                       cache=Depends(get_cache),
+                       events=Depends(get_guest_counter_events)):
     """Update a guest"""
     fields_to_update = {}
 
@@ -161,34 +484,88 @@ async def update_guest(guest_id: str,
     if last_name is not None:
         fields_to_update['last_name'] = last_name
     if inivitation_id is not None:
+        # the new invitation has to belong to the same wedding
+        invitation = await database.invitations.find_one(
+            {'wedding_id': wedding_id, '_id': ObjectId(inivitation_id)},
+            {'_id': 1})
+        if not invitation:
+            raise HTTPException(status_code=400, detail='Invitation not found')
         fields_to_update['invitation_id'] = ObjectId(inivitation_id)
 
-    # Perform the update operation with the fields to update
-    result = database.guests.update_one(
-        {'_id': ObjectId(guest_id)},
-        {'$set': fields_to_update}
+    # keep the search key in sync, the current name is needed when only
+    # one of name and last_name changes
+    if name is not None or last_name is not None:
+        if name is None or last_name is None:
+            current = await database.guests.find_one(
+                {'wedding_id': wedding_id, '_id': ObjectId(guest_id)},
+                {'name': 1, 'last_name': 1})
+            if current:
+                name = name if name is not None else current.get('name')
+                last_name = (last_name if last_name is not None
+                             else current.get('last_name'))
+        fields_to_update['search_key'] = get_search_key(name, last_name)
+
+    # Perform the update operation with the fields to update, the previous
+    # document tells which invitation the guest belonged to
+    guest = await database.guests.find_one_and_update(
+        {'wedding_id': wedding_id, '_id': ObjectId(guest_id)},
+        {'$set': fields_to_update},
+        return_document=ReturnDocument.BEFORE
     )
-    if result.modified_count:
-        guest = database.guests.find_one({'_id': ObjectId(guest_id)})
-        return guest
+    if guest:
+        updated_guest = guest | fields_to_update
+        await touch_invitations(database, wedding_id,
+                                guest.get('invitation_id'),
+                                updated_guest.get('invitation_id'))
+        await refresh_embedded_guests(database, wedding_id,
+                                      guest.get('invitation_id'),
+                                      updated_guest.get('invitation_id'))
+        await cache.invalidate(guest.get('invitation_id'),
+                               updated_guest.get('invitation_id'),
+                               get_report_scope(wedding_id))
+        publish_guest_changes(events, wedding_id, (guest, updated_guest))
+        return updated_guest
     raise HTTPError(status_code=404, detail='Guest not found')
 
 
 @router.delete('/{guest_id}')
-async def delete_guest(guest_id: str, database=Depends(get_database), token: str = Depends(oauth2_scheme)):
+async def delete_guest(guest_id: str, wedding_id: str = Depends(get_wedding_id),
+                       database=Depends(get_database), token: str = Depends(oauth2_scheme),
+                       cache=Depends(get_cache), events=Depends(get_guest_counter_events)):
     """Delete a guest"""
-    result = database.guests.delete_one({'_id': ObjectId(guest_id)})
-    if result.deleted_count:
+    guest = await database.guests.find_one_and_delete(
+        {'wedding_id': wedding_id, '_id': ObjectId(guest_id)})
+    if guest:
+        await touch_invitations(database, wedding_id,
+                                guest.get('invitation_id'))
+        await refresh_embedded_guests(database, wedding_id,
+                                      guest.get('invitation_id'))
+        await cache.invalidate(guest.get('invitation_id'),
+                               get_report_scope(wedding_id))
+        publish_guest_changes(events, wedding_id, (guest, None))
         return {'message': 'Guest deleted successfully'}
     raise HTTPError(status_code=404, detail='Guest not found')
 
 
 @router.patch('/{guest_id}/confirm')
-async def confirm_guest(guest_id: str, menu: FoodOptionsEnum, database=Depends(get_database)):
+async def confirm_guest(guest_id: str, menu: FoodOptionsEnum, wedding_id: str = Depends(get_wedding_id),
+                        database=Depends(get_database),
+                        cache=Depends(get_cache), events=Depends(get_guest_counter_events)):
     """Confirm a guest"""
-    result = database.guests.update_one(
-        {'_id': ObjectId(guest_id)}, {'$set': {'is_confirmed': True, 'menu': menu, 'is_pending': False}})
-    if result.modified_count:
-        guest = database.guests.find_one({'_id': ObjectId(guest_id)})
+    # the previous document gives the counters delta
+    confirmation = {'is_confirmed': True, 'menu': menu, 'is_pending': False}
+    previous = await database.guests.find_one_and_update(
+        {'wedding_id': wedding_id, '_id': ObjectId(guest_id)},
+        {'$set': confirmation},
+        return_document=ReturnDocument.BEFORE)
+    if previous:
+        guest = previous | confirmation
+        publish_guest_changes(events, wedding_id, (previous, guest))
+        await touch_invitations(database, wedding_id,
+                                guest.get('invitation_id'))
+        await refresh_embedded_guests(database, wedding_id,
+                                      guest.get('invitation_id'))
+        await cache.invalidate(guest.get('invitation_id'),
+                               get_report_scope(wedding_id))
         return guest
     raise HTTPError(status_code=404, detail='Guest not found')
@@ -1,9 +1,16 @@
 """Module with health check routes and endpoints of the API"""
 from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi.responses import PlainTextResponse
+from ..database.cache import get_cache
+from ..database.counters import get_seen_buffer
+from ..helpers.metrics import render_gauge, render_metrics
 from ..database.mongodb import get_database, MongoDB
 from pymongo.errors import ConnectionFailure
 
 
+PROMETHEUS_MEDIA_TYPE = 'text/plain; version=0.0.4'
+
+
 router = APIRouter(tags=['health'])
 
 
@@ -17,7 +24,43 @@ async def ping():
 async def read(mongodb: MongoDB = Depends(get_database)):
     """Endpoint to check if the API is ready"""
     try:
-        mongodb.command('ping')
+        await mongodb.command('ping')
         return {"message": "MongoDB connection successful!"}
     except ConnectionFailure:
         return {"message": "Failed to connect to MongoDB."}
+
+
+@router.get('/health/seen_buffer', description='Seen counter buffer stats')
+async def seen_buffer_stats(seen_buffer=Depends(get_seen_buffer)):
+    """Endpoint with the depth and flush latency of the seen buffer"""
+    if seen_buffer is None:
+        return {'enabled': False}
+    return {'enabled': True} | seen_buffer.stats()
+
+
+@router.get('/health/cache', description='Invitations cache stats')
+async def cache_stats(cache=Depends(get_cache)):
+    """Endpoint with the hit and miss counts of the invitations cache"""
+    return cache.stats()
+
+
+@router.get('/metrics', description='Prometheus metrics',
+            response_class=PlainTextResponse)
+async def metrics(cache=Depends(get_cache),
+                  seen_buffer=Depends(get_seen_buffer)):
+    """Endpoint with the request, command, cache and buffer metrics"""
+    lines = render_metrics()
+    cache_stats = cache.stats()
+    lines += render_gauge('invitations_cache_hits', 'Cache hits',
+                          cache_stats['hits'])
+    lines += render_gauge('invitations_cache_misses', 'Cache misses',
+                          cache_stats['misses'])
+    if seen_buffer is not None:
+        lines += render_gauge('seen_buffer_depth',
+                              'Seen increments waiting to be written',
+                              seen_buffer.depth)
+        lines += render_gauge('seen_buffer_last_flush_seconds',
+                              'Duration of the last seen buffer flush',
+                              seen_buffer.last_flush_seconds)
+    return PlainTextResponse('\n'.join(lines) + '\n',
+                             media_type=PROMETHEUS_MEDIA_TYPE)
@@ -1,11 +1,48 @@
 """Module with the routes and endpoints of the API"""
 from fastapi.security import OAuth2PasswordBearer
-from fastapi import Response
+from fastapi import Query, Request, Response
 from datetime import datetime
 from bson import ObjectId
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
 
 from fastapi import APIRouter, Depends, HTTPException
-from ..database.mongodb import get_database
+from ..database.cache import get_cache, get_report_scope
+from ..database.counters import add_view, get_seen_buffer
+from ..database.denormalized import (
+    DENORMALIZED_INVITATIONS,
+    has_embedded_guests,
+    refresh_embedded_guests
+)
+from ..database.mongodb import get_database, run_in_transaction
+from ..database.revisions import touch_invitations
+from ..helpers.etags import (
+    get_invitation_etag,
+    is_not_modified,
+    not_modified_response,
+    set_etag
+)
+from ..helpers.live_counters import (
+    get_guest_counter_events,
+    publish_guest_changes
+)
+from ..helpers.pagination import (
+    MAX_PAGE_SIZE,
+    find_cursor,
+    find_page,
+    next_cursor_headers,
+    set_next_cursor,
+    stream_ndjson,
+    wants_ndjson
+)
+from ..helpers.search import get_search_key
+from ..helpers.serializers import (
+    FAST_JSON_RESPONSES,
+    MongoJSONResponse,
+    serialize_documents
+)
+from ..helpers.single_flight import get_single_flight
+from ..helpers.tenancy import get_wedding_id
 from ..schemas.invitations import (
     InvitationInDB,
     Invitation,
@@ -19,13 +56,70 @@ router = APIRouter(prefix='/invitations',
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-def get_guests_for_invitation(invitation_id, database):
+async def get_guests_for_invitation(invitation_id, wedding_id, database):
     """Get all guests for an invitation"""
-    guests = list(database.guests.find(
-        {'invitation_id': ObjectId(invitation_id)}))
+    guests = await database.guests.find(
+        {'wedding_id': wedding_id, 'invitation_id': ObjectId(invitation_id)}
+    ).to_list(length=None)
     return guests
 
 
+async def get_cached_guests(invitation, database, cache):
+    """Get the guests of an invitation reading them from the cache first"""
+    # keyed by the revision of the ETag, so a fill racing with a write
+    # never pairs the new ETag with the old guests
+    revision = invitation.get('revision', 0)
+    key = f"guests:{invitation['wedding_id']}:{revision}"
+    guests = await cache.get(invitation['_id'], key)
+    if guests is None:
+        guests = await get_guests_for_invitation(
+            invitation['_id'], invitation['wedding_id'], database)
+        await cache.set(invitation['_id'], key, guests)
+    return guests
+
+
+async def attach_cached_guests(invitation, database, cache, single_flight):
+    """Add the guests to an invitation sharing concurrent identical reads"""
+    if has_embedded_guests(invitation):
+        return invitation
+    invitation['guests'] = await single_flight.do(
+        ('invitation_guests', invitation['wedding_id'], invitation['_id'],
+         invitation.get('revision', 0)),
+        lambda: get_cached_guests(invitation, database, cache))
+    return invitation
+
+
+async def get_cached_invitation(invitation_id, wedding_id, database, cache):
+    """Get an invitation of a wedding reading it from the cache first"""
+    # keyed by wedding too so no request reads another wedding's invitation
+    key = f'invitation:{wedding_id}'
+    invitation = await cache.get(invitation_id, key)
+    if invitation is None:
+        invitation = await database.invitations.find_one(
+            {'wedding_id': wedding_id, '_id': invitation_id})
+        if invitation:
+            await cache.set(invitation_id, key, invitation)
+    return invitation
+
+
+async def attach_guests(invitations, wedding_id, database):
+    """Add the guests to each invitation using a single guests query"""
+    guests_by_invitation = {invitation['_id']: []
+                            for invitation in invitations
+                            if not has_embedded_guests(invitation)}
+    if guests_by_invitation:
+        guests = database.guests.find(
+            {'wedding_id': wedding_id,
+             'invitation_id': {'$in': list(guests_by_invitation)}})
+        async for guest in guests:
+            guests_by_invitation[guest['invitation_id']].append(guest)
+
+    for invitation in invitations:
+        if invitation['_id'] in guests_by_invitation:
+            invitation['guests'] = guests_by_invitation[invitation['_id']]
+    return invitations
+
+
 def get_guest_from_list(invitation_id, guests):
     """Get all guests for an invitation"""
     for guest in guests:
@@ -49,102 +143,163 @@ def check_guests_in_invitation(invitation_guest, guests):
 
 
 @router.get('/', response_model=list[InvitationGet])
-async def get_invitations(database=Depends(get_database)):
+async def get_invitations(request: Request,
+                          response: Response,
+                          limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                          after: str = None,
+                          wedding_id: str = Depends(get_wedding_id),
+                          database=Depends(get_database)):
     """Get all invitations"""
-    invitations = list(database.invitations.find({}))
-    # for each invitation, search the guests and add them to the invitation
-    for invitation in invitations:
-        guests = get_guests_for_invitation(invitation['_id'], database)
-        invitation['guests'] = guests
+    query = {'wedding_id': wedding_id}
+
+    async def prepare(invitations):
+        await attach_guests(invitations, wedding_id, database)
+
+    if wants_ndjson(request):
+        return stream_ndjson(
+            find_cursor(database.invitations, query, limit, after),
+            InvitationGet, prepare)
+
+    invitations, next_cursor = await find_page(
+        database.invitations, query, limit, after)
+    await attach_guests(invitations, wedding_id, database)
+    if FAST_JSON_RESPONSES:
+        return MongoJSONResponse(
+            serialize_documents(invitations, InvitationGet),
+            headers=next_cursor_headers(next_cursor))
 
+    set_next_cursor(response, next_cursor)
     return invitations
 
 
 @router.post('/')
-async def create_empty_invitation(name: str, database=Depends(get_database), token: str = Depends(oauth2_scheme)):
+async def create_empty_invitation(name: str, wedding_id: str = Depends(get_wedding_id),
+                                  database=Depends(get_database), token: str = Depends(oauth2_scheme)):
     """Create an empty invitation"""
     # check that name is not empty and unique
     if not name:
         raise HTTPException(status_code=400, detail='Name is required')
-    if database.invitations.find_one({'name': name}):
-        raise HTTPException(status_code=400, detail='Name is not unique')
 
+    created_at = datetime.now()
     empty_invitation_in_db = InvitationInDB(
-        **{'created_at': datetime.now(), 'name': name})
-
-    created_id = database.invitations.insert_one(
-        empty_invitation_in_db.dict()).inserted_id
+        **{'created_at': created_at, 'updated_at': created_at,
+           'wedding_id': wedding_id, 'name': name})
+
+    # uniqueness in the wedding is enforced by the unique index on
+    # wedding_id and name
+    document = empty_invitation_in_db.dict()
+    if DENORMALIZED_INVITATIONS:
+        document |= {'guests': [], 'guests_revision': 0}
+    try:
+        result = await database.invitations.insert_one(document)
+    except DuplicateKeyError as error:
+        raise HTTPException(
+            status_code=400, detail='Name is not unique') from error
 
-    invitation = database.invitations.find_one({'_id': created_id})
+    invitation = await database.invitations.find_one(
+        {'wedding_id': wedding_id, '_id': result.inserted_id})
     invitation['guests'] = []
 
     return invitation
 
 
 @router.delete('/{invitation_id}')
-async def delete_invitation(invitation_id: str, database=Depends(get_database), token: str = Depends(oauth2_scheme)):
+async def delete_invitation(invitation_id: str, wedding_id: str = Depends(get_wedding_id),
+                            database=Depends(get_database), token: str = Depends(oauth2_scheme),
+                            cache=Depends(get_cache)):
     """Delete an invitation"""
-    result = database.invitations.delete_one({'_id': ObjectId(invitation_id)})
+    result = await database.invitations.delete_one(
+        {'wedding_id': wedding_id, '_id': ObjectId(invitation_id)})
+    await cache.invalidate(invitation_id, get_report_scope(wedding_id))
     if result.deleted_count:
         return {'message': 'Invitation deleted successfully'}
     raise HTTPException(status_code=404, detail='Invitation not found')
 
 
 @router.get('/{invitation_id}')
-async def get_invitation(invitation_id: str, database=Depends(get_database)):
+async def get_invitation(invitation_id: str, request: Request, response: Response,
+                         wedding_id: str = Depends(get_wedding_id),
+                         database=Depends(get_database), cache=Depends(get_cache),
+                         single_flight=Depends(get_single_flight)):
     """Get a single invitation"""
-    invitation = database.invitations.find_one(
-        {'_id': ObjectId(invitation_id)})
-    if invitation:
-        guests = get_guests_for_invitation(invitation_id, database)
-        invitation['guests'] = guests
-        return invitation
-    raise HTTPException(status_code=404, detail='Invitation not found')
+    invitation_id = ObjectId(invitation_id)
+    invitation = await single_flight.do(
+        ('cached_invitation', wedding_id, invitation_id),
+        lambda: get_cached_invitation(invitation_id, wedding_id, database,
+                                      cache))
+    if not invitation:
+        raise HTTPException(status_code=404, detail='Invitation not found')
+
+    etag = get_invitation_etag(invitation)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    set_etag(response, etag)
+    return await attach_cached_guests(invitation, database, cache,
+                                      single_flight)
 
 
 @router.get('/by_name/{name}', response_model=InvitationGet)
-async def get_invitation_by_name(name: str, database=Depends(get_database)):
+async def get_invitation_by_name(name: str,
+                                 request: Request,
+                                 response: Response,
+                                 wedding_id: str = Depends(get_wedding_id),
+                                 database=Depends(get_database),
+                                 seen_buffer=Depends(get_seen_buffer),
+                                 cache=Depends(get_cache),
+                                 single_flight=Depends(get_single_flight)):
     """Get a single invitation by name"""
-    invitation = database.invitations.find_one(
-        {'name': name})
+    # every view writes the invitation unless the seen buffer counts it,
+    # only then concurrent requests share the read
+    query = {'wedding_id': wedding_id, 'name': name}
+    invitation = await add_view(
+        database, seen_buffer, query, lambda: single_flight.do(
+            ('invitation_by_name', wedding_id, name),
+            lambda: database.invitations.find_one(query)))
     if invitation:
-        guests = get_guests_for_invitation(invitation['_id'], database)
-        invitation['guests'] = guests
-        # add 1 to seen counter
-        database.invitations.update_one(
-            {'_id': invitation['_id']},
-            {'$inc': {'seen': 1}}
-        )
-
-        # return the updated invitation
-        invitation = database.invitations.find_one(
-            {'_id': invitation['_id']})
-
-        return invitation
+        # the view is counted but unchanged guests are not read again
+        etag = get_invitation_etag(invitation)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+        set_etag(response, etag)
+        return await attach_cached_guests(invitation, database, cache,
+                                          single_flight)
     raise HTTPException(status_code=404, detail='Invitation not found')
 
 
 @router.get('/by_guest_name/', response_model=InvitationGet)
-async def get_invitation_by_guest_name(name: str = '', last_name: str = '', database=Depends(get_database)):
+async def get_invitation_by_guest_name(request: Request, response: Response,
+                                       name: str = '', last_name: str = '',
+                                       wedding_id: str = Depends(get_wedding_id), database=Depends(get_database),
+                                       seen_buffer=Depends(get_seen_buffer), cache=Depends(get_cache),
+                                       single_flight=Depends(get_single_flight)):
     """Get a single invitation by guest name"""
     if not name or not last_name:
         raise HTTPException(status_code=400,
                             detail='Name and last_name is required')
 
-    guest = database.guests.find_one(
-        {'name': name, 'last_name': last_name})
+    # match ignoring case and accents, guests without search key yet are
+    # still found by their exact name
+    search_key = get_search_key(name, last_name)
+    guest = await single_flight.do(
+        ('guest_by_name', wedding_id, search_key, name, last_name),
+        lambda: database.guests.find_one(
+            {'wedding_id': wedding_id,
+             '$or': [{'search_key': search_key},
+                     {'name': name, 'last_name': last_name}]},
+            {'invitation_id': 1}))
     if guest:
-        invitation = database.invitations.find_one(
-            {'_id': guest['invitation_id']})
-        guests = get_guests_for_invitation(invitation['_id'], database)
-        invitation['guests'] = guests
-
-        # add 1 to seen counter
-        database.invitations.update_one(
-            {'_id': invitation['_id']},
-            {'$set': {'seen': invitation['seen'] + 1}}
-        )
-        return invitation
+        query = {'wedding_id': wedding_id, '_id': guest['invitation_id']}
+        invitation = await add_view(
+            database, seen_buffer, query, lambda: single_flight.do(
+                ('invitation', wedding_id, guest['invitation_id']),
+                lambda: database.invitations.find_one(query)))
+        if invitation:
+            etag = get_invitation_etag(invitation)
+            if is_not_modified(request, etag):
+                return not_modified_response(etag)
+            set_etag(response, etag)
+            return await attach_cached_guests(invitation, database, cache,
+                                              single_flight)
 
     raise HTTPException(status_code=404, detail='Invitation not found')
 
@@ -158,15 +313,19 @@ async def options_confirm_guests(invitation_id: str):
 async def confirm_guests(invitation_id: str,
                          guests: list[dict],
                          new_guests: list[dict] = None,
-                         database=Depends(get_database)):
+                         wedding_id: str = Depends(get_wedding_id),
+                         database=Depends(get_database),
+                         cache=Depends(get_cache),
+                         events=Depends(get_guest_counter_events)):
     """Confirm all guests for an invitation"""
     # check that the invitation exists
-    invitation = database.invitations.find_one(
-        {'_id': ObjectId(invitation_id)})
+    invitation = await database.invitations.find_one(
+        {'wedding_id': wedding_id, '_id': ObjectId(invitation_id)})
     if not invitation:
         raise HTTPException(status_code=404, detail='Invitation not found')
 
-    invitation_guests = get_guests_for_invitation(invitation_id, database)
+    invitation_guests = await get_guests_for_invitation(
+        invitation_id, wedding_id, database)
     count_max_new_guests = 0
     # check that the guests exist
     for guest in invitation_guests:
@@ -190,34 +349,59 @@ async def confirm_guests(invitation_id: str,
     if new_guest_length > count_max_new_guests:
         raise HTTPException(status_code=400, detail='Too many new guests')
 
-    # update the guests and check if the guests are from the invitation
-
+    # update the guests and create the new ones with a single bulk write
+    operations = []
+    confirmations = {}
     for guest in guests:
-        id = guest.get('_id')
-        is_attending = guest.get('is_attending')
-        menu = guest.get('menu')
-        database.guests.update_one(
-            {'_id': ObjectId(id)},
-            {'$set': {
-                'is_attending': is_attending,
-                'menu': menu,
-                'is_pending': False
-            }}
-        )
-
-    # create the new guests
+        confirmation = {
+            'is_attending': guest.get('is_attending'),
+            'menu': guest.get('menu'),
+            'is_pending': False
+        }
+        confirmations[str(guest.get('_id'))] = confirmation
+        operations.append(UpdateOne({'wedding_id': wedding_id,
+                                     '_id': ObjectId(guest.get('_id'))},
+                                    {'$set': confirmation}))
+
+    created_guests = []
+    # mongo stores dates with millisecond precision
+    created_at = datetime.now()
+    created_at = created_at.replace(
+        microsecond=created_at.microsecond // 1000 * 1000)
     if new_guests not in [None, []]:
         for new_guest in new_guests:
+            new_guest['wedding_id'] = wedding_id
             new_guest['invitation_id'] = ObjectId(invitation_id)
             new_guest['is_attending'] = True
-            new_guest['created_at'] = datetime.now()
+            new_guest['created_at'] = created_at
             new_guest['is_plus_one'] = True
             new_guest['is_pending'] = False
-            database.guests.insert_one(new_guest)
-
-    # return the updated invitation
-    invitation = database.invitations.find_one(
-        {'_id': ObjectId(invitation_id)})
-    guests = get_guests_for_invitation(invitation_id, database)
-    invitation['guests'] = guests
+            new_guest['search_key'] = get_search_key(
+                new_guest.get('name'), new_guest.get('last_name'))
+            # InsertOne sets the _id of the document before sending it
+            operations.append(InsertOne(new_guest))
+            created_guests.append(new_guest)
+
+    async def write_guests(session):
+        await database.guests.bulk_write(operations, session=session)
+        await touch_invitations(database, wedding_id, invitation_id,
+                                session=session)
+        await refresh_embedded_guests(database, wedding_id, invitation_id,
+                                      session=session)
+
+    if operations:
+        await run_in_transaction(database, write_guests)
+        await cache.invalidate(invitation_id, get_report_scope(wedding_id))
+
+    # return the updated invitation merged in memory
+    changes = [(None, guest) for guest in created_guests]
+    for guest in invitation_guests:
+        confirmation = confirmations.get(str(guest['_id']))
+        if confirmation:
+            changes.append((dict(guest), guest | confirmation))
+            guest.update(confirmation)
+    publish_guest_changes(events, wedding_id, *changes)
+    invitation['guests'] = invitation_guests + created_guests
+    if operations:
+        invitation['revision'] = invitation.get('revision', 0) + 1
     return invitation
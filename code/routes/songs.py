@@ -3,9 +3,34 @@ from fastapi.security import OAuth2PasswordBearer
 from datetime import datetime
 from bson import ObjectId
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Request, Response
+from ..database.cache import get_cache, get_song_ranking_scope
 from ..database.mongodb import get_database
+from ..database.revisions import touch_invitations
+from ..helpers.etags import (
+    get_invitation_etag,
+    is_not_modified,
+    not_modified_response,
+    set_etag
+)
 from ..helpers.http_error import HTTPError
+from ..helpers.pagination import (
+    MAX_PAGE_SIZE,
+    find_cursor,
+    find_page,
+    next_cursor_headers,
+    set_next_cursor,
+    stream_ndjson,
+    wants_ndjson
+)
+from ..helpers.search import get_song_key
+from ..helpers.serializers import (
+    FAST_JSON_RESPONSES,
+    MongoJSONResponse,
+    serialize_documents
+)
+from ..helpers.single_flight import get_single_flight
+from ..helpers.tenancy import get_wedding_id
 from ..schemas.invitations import (
     Song,
     SongInDB,
@@ -17,72 +42,197 @@ router = APIRouter(prefix='/songs',
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+MAX_RANKING_SIZE = 100
+
+
+async def get_cached_songs(invitation_id, wedding_id, revision, database,
+                           cache):
+    """Get the songs of an invitation reading them from the cache first"""
+    # keyed by the revision of the ETag, so a fill racing with a write
+    # never pairs the new ETag with the old songs
+    key = f'songs:{wedding_id}:{revision}'
+    songs = await cache.get(invitation_id, key)
+    if songs is None:
+        songs = await database.songs.find(
+            {'wedding_id': wedding_id, 'invitation_id': invitation_id}
+        ).to_list(length=None)
+        await cache.set(invitation_id, key, songs)
+    return songs
+
 
 @router.get('/', response_model=list[SongGet])
-async def get_songs_list(database=Depends(get_database)):
+async def get_songs_list(request: Request,
+                         response: Response,
+                         limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE),
+                         after: str = None,
+                         wedding_id: str = Depends(get_wedding_id),
+                         database=Depends(get_database)):
     """Get all songs"""
-    songs = list(database.songs.find({}))
+    query = {'wedding_id': wedding_id}
+    if wants_ndjson(request):
+        return stream_ndjson(
+            find_cursor(database.songs, query, limit, after), SongGet)
+
+    songs, next_cursor = await find_page(database.songs, query, limit,
+                                         after)
+    if FAST_JSON_RESPONSES:
+        return MongoJSONResponse(serialize_documents(songs, SongGet),
+                                 headers=next_cursor_headers(next_cursor))
+
+    set_next_cursor(response, next_cursor)
     return songs
 
 
+def get_ranking_pipeline(wedding_id: str, limit: int) -> list:
+    """Requests of each song of a wedding, the most requested first"""
+    return [
+        {'$match': {'wedding_id': wedding_id, 'name_key': {'$ne': None}}},
+        {'$group': {
+            '_id': '$name_key',
+            # "Dancing Queen - ABBA" sorts before "dancing queen - abba!"
+            'name': {'$min': '$name'},
+            'requests': {'$sum': 1},
+            'invitation_ids': {'$addToSet': '$invitation_id'},
+        }},
+        {'$sort': {'requests': -1, '_id': 1}},
+        {'$limit': limit},
+        {'$lookup': {
+            'from': 'invitations',
+            'localField': 'invitation_ids',
+            'foreignField': '_id',
+            'as': 'invitations'
+        }},
+        {'$project': {'_id': 0, 'name_key': '$_id', 'name': 1,
+                      'requests': 1, 'invitations._id': 1,
+                      'invitations.name': 1}},
+    ]
+
+
+@router.get('/top')
+async def get_top_songs(limit: int = Query(10, ge=1, le=MAX_RANKING_SIZE),
+                        wedding_id: str = Depends(get_wedding_id),
+                        database=Depends(get_database),
+                        cache=Depends(get_cache)):
+    """Most requested songs with the invitations that requested them"""
+    ranking_scope = get_song_ranking_scope(wedding_id)
+    ranking = await cache.get(ranking_scope, f'top:{limit}')
+    if ranking is not None:
+        return ranking
+
+    songs = await database.songs.aggregate(
+        get_ranking_pipeline(wedding_id, limit)).to_list(length=None)
+    ranking = [song | {'invitations': sorted(
+        ({'_id': str(invitation['_id']), 'name': invitation.get('name')}
+         for invitation in song['invitations']),
+        key=lambda invitation: invitation['name'] or '')}
+        for song in songs]
+    await cache.set(ranking_scope, f'top:{limit}', ranking)
+    return ranking
+
+
 @router.get('/{song_id}', response_model=SongGet)
-async def get_song(song_id: str, database=Depends(get_database)):
+async def get_song(song_id: str,
+                   wedding_id: str = Depends(get_wedding_id),
+                   database=Depends(get_database)):
     """Get a song"""
-    song = database.songs.find_one({'_id': ObjectId(song_id)})
+    song = await database.songs.find_one({'wedding_id': wedding_id,
+                                          '_id': ObjectId(song_id)})
     if song:
         return song
     raise HTTPError(status_code=404, detail='Song not found')
 
 
 @router.get('/invitation/{invitation_id}', response_model=list[SongGet])
-async def get_songs_for_invitation(invitation_id: str, database=Depends(get_database)):
+async def get_songs_for_invitation(invitation_id: str, request: Request, response: Response,
+                                   wedding_id: str = Depends(get_wedding_id),
+                                   database=Depends(get_database), cache=Depends(get_cache),
+                                   single_flight=Depends(get_single_flight)):
     """Get all songs for an invitation"""
-    songs = list(database.songs.find(
-        {'invitation_id': ObjectId(invitation_id)}))
-    return songs
+    invitation_id = ObjectId(invitation_id)
+    # song changes bump the revision of their invitation
+    invitation = await single_flight.do(
+        ('invitation_revision', wedding_id, invitation_id),
+        lambda: database.invitations.find_one(
+            {'wedding_id': wedding_id, '_id': invitation_id},
+            {'revision': 1}))
+    revision = None
+    if invitation:
+        revision = invitation.get('revision', 0)
+        etag = get_invitation_etag(invitation)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+        set_etag(response, etag)
+
+    return await single_flight.do(
+        ('invitation_songs', wedding_id, invitation_id, revision),
+        lambda: get_cached_songs(invitation_id, wedding_id, revision,
+                                 database, cache))
 
 
 @router.post('/', response_model=SongGet)
 async def create_song(name: str,
                       invitation_id: str,
-                      database=Depends(get_database)):
+                      wedding_id: str = Depends(get_wedding_id),
+                      database=Depends(get_database),
+                      cache=Depends(get_cache)):
     """Create a song"""
     # check that invitation exists
     if invitation_id:
-        invitation = database.invitations.find_one(
-            {'_id': ObjectId(invitation_id)})
+        invitation = await database.invitations.find_one(
+            {'wedding_id': wedding_id, '_id': ObjectId(invitation_id)})
         if not invitation:
             raise HTTPError(status_code=400, detail='Invitation not found')
 
-    song = Song(name=name,
+    song = Song(wedding_id=wedding_id,
+                name=name,
                 invitation_id=invitation_id)
 
     song_in_db = SongInDB(
         **song.dict(), **{'created_at': datetime.now()})
 
-    song_id = database.songs.insert_one(song_in_db.dict()).inserted_id
-    song = database.songs.find_one({'_id': song_id})
+    result = await database.songs.insert_one(
+        song_in_db.dict() | {'name_key': get_song_key(name)})
+    await touch_invitations(database, wedding_id, song_in_db.invitation_id,
+                            guests=False)
+    await cache.invalidate(song_in_db.invitation_id,
+                           get_song_ranking_scope(wedding_id))
+    song = await database.songs.find_one({'wedding_id': wedding_id,
+                                          '_id': result.inserted_id})
     return song
 
 
 @router.put('/{song_id}', response_model=SongGet)
-async def update_song(song_id: str, name: str, database=Depends(get_database), token: str = Depends(oauth2_scheme)):
+async def update_song(song_id: str, name: str, wedding_id: str = Depends(get_wedding_id),
+                      database=Depends(get_database), token: str = Depends(oauth2_scheme),
+                      cache=Depends(get_cache)):
     """Update a song"""
+    query = {'wedding_id': wedding_id, '_id': ObjectId(song_id)}
     # check that song exists
-    song = database.songs.find_one({'_id': ObjectId(song_id)})
+    song = await database.songs.find_one(query)
     if not song:
         raise HTTPError(status_code=400, detail='Song not found')
 
     # update song
-    database.songs.update_one(
-        {'_id': ObjectId(song_id)}, {'$set': {'name': name}})
+    await database.songs.update_one(
+        query, {'$set': {'name': name, 'name_key': get_song_key(name)}})
+    await touch_invitations(database, wedding_id, song.get('invitation_id'),
+                            guests=False)
+    await cache.invalidate(song.get('invitation_id'),
+                           get_song_ranking_scope(wedding_id))
     return {'id': song_id, 'name': name}
 
 
 @router.delete('/{song_id}')
-async def delete_song(song_id: str, database=Depends(get_database), token: str = Depends(oauth2_scheme)):
+async def delete_song(song_id: str, wedding_id: str = Depends(get_wedding_id),
+                      database=Depends(get_database), token: str = Depends(oauth2_scheme),
+                      cache=Depends(get_cache)):
     """Delete a song"""
-    result = database.songs.delete_one({'_id': ObjectId(song_id)})
-    if result.deleted_count:
+    song = await database.songs.find_one_and_delete(
+        {'wedding_id': wedding_id, '_id': ObjectId(song_id)})
+    if song:
+        await touch_invitations(database, wedding_id,
+                                song.get('invitation_id'), guests=False)
+        await cache.invalidate(song.get('invitation_id'),
+                               get_song_ranking_scope(wedding_id))
         return {'message': 'Song deleted successfully'}
     raise HTTPError(status_code=404, detail='Song not found')
@@ -15,6 +15,7 @@ class FoodOptionsEnum(str, Enum):
 
 class Guest(BaseModel):
     """Basic Guest params"""
+    wedding_id: str
     name: str
     last_name: str
     is_attending: bool = None
@@ -43,6 +44,7 @@ class GuestGet(GuestInDB):
 
 class Invitation(BaseModel):
     """Basic Invitation params"""
+    wedding_id: str
     name: str
     seen: int = 0
 
@@ -58,6 +60,9 @@ class InvitationEdit(BaseModel):
 class InvitationInDB(Invitation):
     """Invitation in database"""
     created_at: datetime
+    # bumped whenever the guests or songs of the invitation change
+    revision: int = 0
+    updated_at: datetime = None
 
 
 class InvitationGet(InvitationInDB):
@@ -73,6 +78,7 @@ class InvitationGet(InvitationInDB):
 
 class Song(BaseModel):
     """Basic Song params"""
+    wedding_id: str
     name: str
     invitation_id: PyObjectId
 
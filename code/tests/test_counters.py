@@ -0,0 +1,89 @@
+"""Tests of the seen counter buffer"""
+
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+from ..database.counters import SeenCounterBuffer
+
+
+class SlowInvitations:
+    """Invitations collection whose bulk writes take a while"""
+
+    def __init__(self, failed_indexes=()):
+        self.failed_indexes = failed_indexes
+        self.seen = {}
+
+    async def bulk_write(self, operations, ordered=True):
+        """Applies the $inc of the operations that do not fail"""
+        await asyncio.sleep(0.05)
+        for index, operation in enumerate(operations):
+            if index not in self.failed_indexes:
+                # pylint: disable=protected-access
+                invitation_id = operation._filter['_id']
+                self.seen[invitation_id] = (self.seen.get(invitation_id, 0)
+                                            + operation._doc['$inc']['seen'])
+        if self.failed_indexes:
+            raise BulkWriteError({'writeErrors': [
+                {'index': index, 'errmsg': 'failed'}
+                for index in self.failed_indexes]})
+
+
+class Database:
+    """Database with only the invitations collection"""
+
+    def __init__(self, invitations):
+        self.invitations = invitations
+
+
+def test_stop_waits_for_the_flush_in_flight():
+    """Stopping during a periodic flush writes every increment once"""
+    invitations = SlowInvitations()
+
+    async def stop_during_flush():
+        buffer = SeenCounterBuffer(Database(invitations), interval=0.01)
+        buffer.start()
+        for _ in range(5):
+            buffer.increment(('wedding', 'invitation'))
+        # the periodic flush is writing when the buffer stops
+        await asyncio.sleep(0.03)
+        await buffer.stop()
+        return buffer
+
+    buffer = asyncio.run(stop_during_flush())
+    assert invitations.seen == {'invitation': 5}
+    assert buffer.depth == 0
+
+
+def test_partial_failure_keeps_only_the_failed_increments():
+    """Increments applied by a failed bulk write are not written again"""
+    invitations = SlowInvitations(failed_indexes={1})
+    buffer = SeenCounterBuffer(Database(invitations))
+    for invitation_id in ('first', 'second', 'second', 'third'):
+        buffer.increment(('wedding', invitation_id))
+
+    try:
+        asyncio.run(buffer.flush())
+    except BulkWriteError:
+        pass
+
+    assert invitations.seen == {'first': 1, 'third': 1}
+    assert dict(buffer.pending) == {('wedding', 'second'): 2}
+
+
+def test_threshold_flush_failure_is_logged(caplog):
+    """A failed flush started by the buffer size is logged like run()"""
+    invitations = SlowInvitations(failed_indexes={0})
+
+    async def fill_buffer():
+        buffer = SeenCounterBuffer(Database(invitations), max_size=2)
+        buffer.increment(('wedding', 'first'))
+        buffer.increment(('wedding', 'second'))
+        task, = buffer._flush_tasks  # pylint: disable=protected-access
+        await task
+        return buffer, task
+
+    buffer, task = asyncio.run(fill_buffer())
+    assert task.exception() is None
+    assert 'Seen counters flush failed' in caplog.text
+    assert dict(buffer.pending) == {('wedding', 'first'): 1}
@@ -0,0 +1,65 @@
+"""Tests of the invitation routes"""
+
+import asyncio
+
+import httpx
+
+from ..database.mongodb import get_database, get_mock_database
+from ..main import app
+
+
+CONCURRENT_LOOKUPS = 300
+# the endpoints only check the header is present
+AUTHORIZATION = {'Authorization': 'Bearer test'}
+
+
+async def count_concurrent_views(url: str, params=None):
+    """Sends CONCURRENT_LOOKUPS requests at once, returns their seen"""
+    async with httpx.AsyncClient(app=app, base_url='http://test',
+                                 headers=AUTHORIZATION) as client:
+        response = await client.post('/invitations/',
+                                     params={'name': 'family'})
+        invitation_id = response.json()['_id']
+        await client.post('/guests/', params={
+            'name': 'José', 'last_name': 'Pérez',
+            'invitation_id': invitation_id})
+
+        responses = await asyncio.gather(*[
+            client.get(url, params=params)
+            for _ in range(CONCURRENT_LOOKUPS)])
+    assert {response.status_code for response in responses} == {200}
+    return sorted(response.json()['seen'] for response in responses)
+
+
+def run_with_mock_database(lookups):
+    """Runs lookups() against an empty mock database"""
+    database = get_mock_database()
+    app.dependency_overrides[get_database] = lambda: database
+    try:
+        return database, asyncio.run(lookups())
+    finally:
+        app.dependency_overrides.pop(get_database)
+
+
+def test_concurrent_lookups_by_name_count_every_view():
+    """Every concurrent lookup by name adds exactly one view"""
+    database, seen = run_with_mock_database(
+        lambda: count_concurrent_views('/invitations/by_name/family'))
+
+    assert seen == list(range(1, CONCURRENT_LOOKUPS + 1))
+    invitation = asyncio.run(database.invitations.find_one(
+        {'name': 'family'}))
+    assert invitation['seen'] == CONCURRENT_LOOKUPS
+
+
+def test_concurrent_lookups_by_guest_name_count_every_view():
+    """Every concurrent lookup by guest name adds exactly one view"""
+    database, seen = run_with_mock_database(
+        lambda: count_concurrent_views(
+            '/invitations/by_guest_name/',
+            {'name': 'jose', 'last_name': 'perez'}))
+
+    assert seen == list(range(1, CONCURRENT_LOOKUPS + 1))
+    invitation = asyncio.run(database.invitations.find_one(
+        {'name': 'family'}))
+    assert invitation['seen'] == CONCURRENT_LOOKUPS
@@ -0,0 +1,31 @@
+"""Tests of the request metrics"""
+
+import asyncio
+
+import httpx
+
+from ..helpers.metrics import (
+    DB_COMMANDS_PER_REQUEST,
+    HTTP_REQUEST_SECONDS,
+    UNMATCHED_ROUTE
+)
+from ..main import app
+
+
+async def get_paths(*paths):
+    """Sends a GET request to every path"""
+    async with httpx.AsyncClient(app=app, base_url='http://test') as client:
+        return [await client.get(path) for path in paths]
+
+
+def test_unmatched_paths_share_one_route_label():
+    """Paths no route matches do not add a series each"""
+    responses = asyncio.run(get_paths(
+        *[f'/wp-admin/{number}.php' for number in range(3)]))
+
+    assert {response.status_code for response in responses} == {404}
+    for histogram in (HTTP_REQUEST_SECONDS, DB_COMMANDS_PER_REQUEST):
+        routes = {labels[histogram.label_names.index('route')]
+                  for labels in histogram.values}
+        assert UNMATCHED_ROUTE in routes
+        assert not any(route.startswith('/wp-admin') for route in routes)
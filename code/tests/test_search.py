@@ -0,0 +1,27 @@
+"""Tests of the search keys"""
+
+from ..helpers.search import get_song_key
+
+
+def test_song_key_matches_title_and_artist_in_either_order():
+    """The title and the artist give the same key in any order"""
+    assert (get_song_key('Dancing Queen - ABBA')
+            == get_song_key('ABBA – Dancing Queen')
+            == get_song_key('abba | dancing queen'))
+    assert (get_song_key("Queen - Don't Stop Me Now")
+            == get_song_key('Dont Stop Me Now - Queen'))
+
+
+def test_song_key_keeps_songs_of_the_same_artist_apart():
+    """Songs of one artist do not share the key of the artist"""
+    assert get_song_key('ABBA - Dancing Queen') != get_song_key(
+        'ABBA - Mamma Mia')
+    assert get_song_key('Queen - Bohemian Rhapsody') != get_song_key(
+        "Queen - Don't Stop Me Now")
+
+
+def test_song_key_ignores_case_accents_and_punctuation():
+    """Spellings of a song share its key"""
+    assert get_song_key('Mamma Mía!') == get_song_key('mamma mia')
+    assert get_song_key("Don’t Stop Me Now") == 'dont stop me now'
+    assert get_song_key('!!!') == '!!!'